@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark how responsive an asyncio event loop stays while matching
+
+Concurrent client tasks match a corpus of texts while a monitor task sleeps
+for --interval over and over and records how late it wakes up. The lag is
+reported for inline matching, where the clients call PatternSet.match()
+directly as match_patterns() users do, and for AsyncMatcher on threads and
+on worker processes.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from pattern_bundle import find_product_files, iter_product_patterns, read_product
+from pattern_matcher import AsyncMatcher, PatternSet
+from pattern_matcher.loader import preload_products
+from pattern_matcher.server import percentile
+
+
+def load_corpus(patterns_dir, path=None):
+    """Return the texts to match: the lines of path, or the inputs of the patterns' test cases"""
+    if path:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return [line.rstrip('\r\n') for line in f]
+    
+    texts = []
+    products = preload_products(patterns_dir, metadata=True)
+    for relpath in find_product_files(patterns_dir):
+        data = read_product(os.path.join(patterns_dir, relpath), products)
+        for pattern_data in iter_product_patterns(data):
+            for test_case in pattern_data.get('metadata', {}).get('test_cases', []):
+                if test_case.get('input'):
+                    texts.append(test_case['input'])
+    return texts
+
+
+async def monitor_lag(interval, lags, done):
+    """Sleep for interval until done is set, recording how late each wakeup is"""
+    while not done.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run_clients(match, texts, concurrency):
+    """Match texts from concurrency client tasks, each taking every concurrency-th text"""
+    async def client(offset):
+        for text in texts[offset::concurrency]:
+            await match(text)
+    
+    await asyncio.gather(*(client(offset) for offset in range(concurrency)))
+
+
+async def measure(match, texts, concurrency, interval):
+    """Return (seconds, lags) of matching texts while monitoring the event loop"""
+    lags = []
+    done = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(interval, lags, done))
+    start = time.perf_counter()
+    try:
+        await run_clients(match, texts, concurrency)
+    finally:
+        elapsed = time.perf_counter() - start
+        done.set()
+        await monitor
+    return elapsed, lags
+
+
+async def benchmark(args, pattern_set, patterns_dir, texts):
+    """Measure every mode and return {mode: (seconds, lags)}"""
+    async def match_inline(text):
+        pattern_set.match(text)
+        # Give the loop a turn between texts, as a well-behaved collector would
+        await asyncio.sleep(0)
+    
+    measurements = {'inline': await measure(match_inline, texts, args.concurrency, args.interval)}
+    
+    async with AsyncMatcher(pattern_set, args.workers) as matcher:
+        measurements['threads'] = await measure(matcher.match, texts, args.concurrency, args.interval)
+    
+    if args.processes:
+        async with AsyncMatcher.processes(args.processes, patterns_dir) as matcher:
+            # Wait until the workers have loaded their patterns
+            await matcher.match('')
+            measurements['processes'] = await measure(matcher.match, texts, args.concurrency, args.interval)
+    
+    return measurements
+
+
+def main():
+    """Main function"""
+    workspace_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    patterns_dir = os.path.join(workspace_dir, 'patterns')
+    
+    parser = argparse.ArgumentParser(description="Benchmark event-loop lag while matching from asyncio")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="match the lines of FILE (default: the inputs of the patterns' test cases)")
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help="client tasks matching at the same time (default: 16)")
+    parser.add_argument('--workers', type=int, default=2,
+                        help="executor threads of the threaded AsyncMatcher (default: 2)")
+    parser.add_argument('--processes', type=int, default=2, metavar='N',
+                        help="also measure AsyncMatcher on N worker processes, 0 to skip (default: 2)")
+    parser.add_argument('--interval', type=float, default=0.001, metavar='SECONDS',
+                        help="sleep of the lag monitor (default: 0.001)")
+    parser.add_argument('--max-lag-ms', type=float,
+                        help="fail if the p99 lag of an AsyncMatcher mode exceeds this")
+    args = parser.parse_args()
+    
+    texts = load_corpus(patterns_dir, args.batch)
+    pattern_set = PatternSet.load(patterns_dir)
+    print(f"Matching {len(texts)} texts against {len(pattern_set)} patterns "
+          f"from {args.concurrency} concurrent tasks")
+    
+    measurements = asyncio.run(benchmark(args, pattern_set, patterns_dir, texts))
+    
+    failures = []
+    for mode, (seconds, lags) in measurements.items():
+        lags = sorted(lags)
+        p50, p99, worst = (percentile(lags, fraction) * 1000 for fraction in (0.5, 0.99, 1.0))
+        print(f"{mode:>10}: {len(texts) / seconds:8.0f} texts/s, "
+              f"event-loop lag p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {worst:.2f} ms")
+        if args.max_lag_ms is not None and mode != 'inline' and p99 > args.max_lag_ms:
+            failures.append(f"{mode} p99 lag {p99:.2f} ms exceeds {args.max_lag_ms:.2f} ms")
+    
+    for failure in failures:
+        print(f"Failed: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
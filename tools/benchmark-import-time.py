@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark the import time of the pattern_matcher package
+
+Each statement below runs in a fresh interpreter, several times, and the
+median time and the modules it imported are reported. The run fails (exit
+code 1) when importing the package takes longer than --max-ms, when
+importing the matching API takes longer than --max-api-ms, or when a
+statement imports a module it should leave alone, so an import added at the
+top of the wrong module shows up as a failure rather than as a slow start.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs a statement and prints its duration and the modules it imported
+PROBE = """
+import sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+exec(compile({statement!r}, '<benchmark>', 'exec'))
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(' '.join(sorted(set(sys.modules) - before)))
+"""
+
+# Modules a bare "import pattern_matcher" may load: the package and the import machinery,
+# which also imports types on Python 3.8
+IMPORT_MODULES = {'pattern_matcher', 'importlib', 'importlib._bootstrap', 'importlib._bootstrap_external',
+                  'importlib.machinery', 'types', 'warnings'}
+
+# Modules only the daemon, the process pool or the catalog need
+HEAVY_MODULES = {'http.server', 'multiprocessing', 'socketserver', 'sqlite3'}
+
+# (name, statement, option holding its budget or None, check on the modules it imported)
+BENCHMARKS = [
+    ('import', 'import pattern_matcher', 'max_ms',
+     lambda modules: sorted(set(modules) - IMPORT_MODULES)),
+    ('matching API', 'from pattern_matcher import PatternSet, load_patterns', 'max_api_ms',
+     lambda modules: sorted(HEAVY_MODULES.intersection(modules))),
+    ('first match', "import pattern_matcher; pattern_matcher.match('Server: Apache/2.4.41')", None,
+     lambda modules: sorted(HEAVY_MODULES.intersection(modules))),
+]
+
+
+def run_probe(statement, tools_dir):
+    """Run a statement in a fresh interpreter and return (seconds, imported modules)"""
+    env = dict(os.environ, PYTHONPATH=tools_dir)
+    output = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement)], env=env,
+                            capture_output=True, text=True, check=True).stdout.splitlines()
+    return float(output[-2]), output[-1].split()
+
+
+def main():
+    """Main function"""
+    tools_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the pattern_matcher package")
+    parser.add_argument('--runs', type=int, default=10,
+                        help="fresh interpreters per statement (default: 10)")
+    parser.add_argument('--max-ms', type=float, default=10.0,
+                        help="fail if the median time of 'import pattern_matcher' exceeds this (default: 10)")
+    parser.add_argument('--max-api-ms', type=float, default=150.0,
+                        help="fail if the median time of importing PatternSet and load_patterns exceeds this "
+                             "(default: 150)")
+    args = parser.parse_args()
+    
+    failures = []
+    for name, statement, budget_option, check in BENCHMARKS:
+        timings = []
+        for run in range(args.runs):
+            seconds, modules = run_probe(statement, tools_dir)
+            timings.append(seconds * 1000)
+        
+        median = statistics.median(timings)
+        print(f"{name}: {statement}")
+        print(f"  median {median:.2f} ms, min {min(timings):.2f} ms, {len(modules)} modules imported")
+        
+        unexpected = check(modules)
+        if unexpected:
+            failures.append(f"{name} imports {', '.join(unexpected)}")
+        budget = getattr(args, budget_option) if budget_option else None
+        if budget is not None and median > budget:
+            failures.append(f"{name} takes {median:.2f} ms, over the budget of {budget:.2f} ms")
+    
+    if failures:
+        print("\nImport time check failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    
+    print("\nImport time check passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Time every pattern against a reference corpus and enforce a performance budget
+
+Each pattern is compiled on its own and searched in every text of the
+reference corpus (benchmark-corpus.jsonl, realistic HTTP responses and
+service banners) and in its own test inputs. The fastest of --repeats runs
+of each search is kept, and the patterns are ranked by their average time
+per search. The searches run in a worker process that is killed when one
+pattern keeps it busy for longer than PATTERN_STALL_SECONDS, so a pattern
+that backtracks catastrophically cannot hang the timing; it is reported as
+stalled. A new or changed pattern that stalls is also left out of the
+throughput measurement below.
+
+The run fails (exit code 1) when:
+
+- a new or changed pattern averages more than --budget-us microseconds per
+  search, or stalls. Patterns count as new or changed when their regex does not occur
+  in the same product file at the base of --changed, and with --changed
+  only they are timed; without it every pattern is timed and the ones over
+  the budget are only listed.
+- the throughput of the whole pattern database over the corpus regresses by
+  more than --max-regression percent against the stored baseline. Raw
+  throughput depends on the machine, so it is compared after dividing it by
+  the speed of a fixed calibration workload measured alongside it. The
+  calibration does not cancel out differences between Python versions, so
+  a baseline recorded with another major.minor version is not compared.
+  CI runs Python 3.8, and the stored baseline is recorded with it.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from build_state import file_hash
+from pattern_bundle import find_product_files, iter_product_patterns, read_product
+from pattern_matcher import PatternSet, load_patterns, split_response
+from validation_index import changed_files
+
+BASELINE_VERSION = 1
+
+# Average microseconds per search a new or changed pattern may take
+DEFAULT_BUDGET_US = 100.0
+
+# Percent the normalized throughput may drop below the baseline
+DEFAULT_MAX_REGRESSION = 10.0
+
+# A search slower than this is not repeated, timer noise no longer matters
+SLOW_SEARCH_SECONDS = 0.001
+
+# Seconds of searches after which a pattern's remaining texts are skipped
+PATTERN_TIME_LIMIT = 1.0
+
+# Seconds one pattern may keep the timing worker busy before the worker is killed
+PATTERN_STALL_SECONDS = 2 * PATTERN_TIME_LIMIT
+
+# Regexes whose search speed over the corpus calibrates throughput for the machine
+CALIBRATION_PATTERNS = [
+    r'Server: Apache/([\d.]+)',
+    r'<meta name="generator" content="([^"]+)"',
+    r'(?i)powered by ([a-z]+)',
+    r'X-Powered-By: PHP/([\d.]+)',
+    r'<title>([^<]*)</title>',
+    r'nginx/(\d+\.\d+\.\d+)',
+    r'wp-(?:content|includes)/',
+    r'(?:jquery|bootstrap)[.-]([\d.]+)(?:\.min)?\.js',
+    r'SSH-2\.0-OpenSSH_([\w.]+)',
+    r'\bVersion ([\d.()A-Za-z]+)',
+]
+
+
+def load_corpus(path):
+    """Return the (id, item) pairs of a JSONL corpus of texts and response records"""
+    corpus = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            corpus.append((item.get('id', line_number) if isinstance(item, dict) else line_number, item))
+    return corpus
+
+
+def corpus_text(item):
+    """Return the text a pattern scoped to the whole input is searched in"""
+    if not isinstance(item, dict):
+        return item
+    if 'text' in item:
+        return item['text'] or ''
+    status, header_lines, body = split_response(item)
+    header_block = '\r\n'.join(line for name, line in header_lines)
+    return '\r\n\r\n'.join(part for part in (header_block, body) if part)
+
+
+def time_search(regex, text, repeats):
+    """Return the fastest of up to repeats searches of text, in seconds"""
+    fastest = None
+    for repeat in range(repeats):
+        start = time.perf_counter()
+        regex.search(text)
+        seconds = time.perf_counter() - start
+        fastest = seconds if fastest is None else min(fastest, seconds)
+        if fastest > SLOW_SEARCH_SECONDS:
+            break
+    return fastest
+
+
+def product_patterns(data, relpath):
+    """Return the patterns of product file data, raising ValueError if it is malformed"""
+    try:
+        patterns = list(iter_product_patterns(data))
+    except (AttributeError, TypeError):
+        raise ValueError(f"{relpath} does not hold pattern lists under all_versions and versions") from None
+    for position, pattern_data in enumerate(patterns):
+        if not isinstance(pattern_data, dict):
+            raise ValueError(f"pattern {position} of {relpath} is not an object")
+    return patterns
+
+
+def test_inputs(pattern_data):
+    """Return the inputs of a pattern's test cases"""
+    metadata = pattern_data.get('metadata')
+    test_cases = metadata.get('test_cases') if isinstance(metadata, dict) else None
+    if not isinstance(test_cases, list):
+        return []
+    return [test_case['input'] for test_case in test_cases
+            if isinstance(test_case, dict) and isinstance(test_case.get('input'), str)]
+
+
+def timing_worker(texts, repeats, conn):
+    """Time the (pattern, test inputs) requests of time_patterns() until it sends None
+    
+    A pattern whose searches add up to PATTERN_TIME_LIMIT is not searched in
+    the remaining texts, so its search times only cover the texts before.
+    """
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        pattern, inputs = request
+        regex = re.compile(pattern)
+        searches = []
+        for text in inputs + texts:
+            searches.append(time_search(regex, text, repeats))
+            if sum(searches) > PATTERN_TIME_LIMIT:
+                break
+        conn.send(searches)
+
+
+def time_patterns(patterns_dir, texts, repeats, only=None):
+    """Time every pattern, or those whose ID is in only, against texts and its test inputs
+    
+    Returns (timings, stalled). timings holds (pattern ID, name, pattern,
+    searches, seconds, slowest search) records; patterns that do not compile
+    are skipped. The searches run in a timing_worker() process, which is
+    killed and replaced when a pattern takes longer than
+    PATTERN_STALL_SECONDS; stalled holds the (pattern ID, name) of those.
+    """
+    timings = []
+    stalled = []
+    relpaths = find_product_files(patterns_dir)
+    if only is not None:
+        relpaths = sorted({pattern_id.rsplit('#', 1)[0] for pattern_id in only})
+    
+    process = conn = None
+    try:
+        for relpath in relpaths:
+            try:
+                patterns = product_patterns(read_product(os.path.join(patterns_dir, relpath)), relpath)
+            except (OSError, ValueError):
+                continue
+            for position, pattern_data in enumerate(patterns):
+                pattern_id = f"{relpath}#{position}"
+                if only is not None and pattern_id not in only:
+                    continue
+                try:
+                    re.compile(pattern_data['pattern'])
+                except (KeyError, TypeError, re.error):
+                    continue
+                
+                if process is None:
+                    conn, child_conn = multiprocessing.Pipe()
+                    process = multiprocessing.Process(target=timing_worker, args=(texts, repeats, child_conn),
+                                                      daemon=True)
+                    process.start()
+                    child_conn.close()
+                conn.send((pattern_data['pattern'], test_inputs(pattern_data)))
+                if not conn.poll(PATTERN_STALL_SECONDS):
+                    process.kill()
+                    process.join()
+                    conn.close()
+                    process = None
+                    stalled.append((pattern_id, pattern_data.get('name', '')))
+                    continue
+                searches = conn.recv()
+                timings.append((pattern_id, pattern_data.get('name', ''), pattern_data['pattern'],
+                                len(searches), sum(searches), max(searches)))
+    finally:
+        if process is not None:
+            conn.send(None)
+            process.join()
+            conn.close()
+    return timings, stalled
+
+
+def measure_throughput(pattern_set, items, texts, rounds):
+    """Return (throughput, calibration rate, normalized throughput) of a pattern set over the corpus
+    
+    Each round matches the corpus with the pattern set, then runs the
+    calibration workload for as long, so that both see the same machine
+    conditions. Throughput (inputs per second) and calibration rate
+    (searches per second) are the best of rounds; the normalized throughput
+    is the median over rounds of their ratio within a round.
+    """
+    regexes = [re.compile(pattern) for pattern in CALIBRATION_PATTERNS]
+    best_match = best_calibration = None
+    ratios = []
+    for round_number in range(rounds):
+        start = time.perf_counter()
+        for item in items:
+            pattern_set.match_input(item)
+        match_seconds = time.perf_counter() - start
+        best_match = match_seconds if best_match is None else min(best_match, match_seconds)
+        
+        searches = 0
+        start = time.perf_counter()
+        while True:
+            for text in texts:
+                for regex in regexes:
+                    regex.search(text)
+            searches += len(texts) * len(regexes)
+            calibration_seconds = time.perf_counter() - start
+            if calibration_seconds >= match_seconds:
+                break
+        rate = searches / calibration_seconds
+        best_calibration = rate if best_calibration is None else max(best_calibration, rate)
+        ratios.append(len(items) / match_seconds / rate)
+    return len(items) / best_match, best_calibration, statistics.median(ratios)
+
+
+def revision_base(repo_root, revisions):
+    """Return the revision the changes in a git revision range are compared against"""
+    if '...' in revisions:
+        start, end = revisions.split('...', 1)
+        return subprocess.run(['git', 'merge-base', start or 'HEAD', end or 'HEAD'], cwd=repo_root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    if '..' in revisions:
+        return revisions.split('..', 1)[0] or 'HEAD'
+    return revisions
+
+
+def changed_pattern_ids(repo_root, patterns_dir, revisions):
+    """Return the IDs of the patterns that are new or changed in a git revision range
+    
+    A pattern is new or changed when its regex does not occur in the same
+    product file at the base revision. Raises ValueError for a changed
+    product file that is malformed.
+    """
+    base = revision_base(repo_root, revisions)
+    pattern_ids = set()
+    for path in changed_files(repo_root, revisions):
+        relpath = os.path.relpath(path, patterns_dir)
+        try:
+            old_source = subprocess.run(['git', 'show', f"{base}:patterns/{relpath}"], cwd=repo_root,
+                                        capture_output=True, text=True, check=True).stdout
+            old_patterns = {pattern_data.get('pattern')
+                            for pattern_data in product_patterns(json.loads(old_source), relpath)}
+        except (subprocess.CalledProcessError, ValueError):
+            old_patterns = set()
+        try:
+            data = read_product(path)
+        except OSError:
+            # Deleted in the range
+            continue
+        except ValueError as e:
+            raise ValueError(f"{relpath} is not valid JSON: {e}") from None
+        for position, pattern_data in enumerate(product_patterns(data, relpath)):
+            if pattern_data.get('pattern') not in old_patterns:
+                pattern_ids.add(f"{relpath}#{position}")
+    return pattern_ids
+
+
+def load_baseline(path):
+    """Load a stored baseline, or return None if it is missing or unusable"""
+    try:
+        with open(path, 'r') as f:
+            baseline = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(baseline, dict) or baseline.get('version') != BASELINE_VERSION:
+        return None
+    return baseline
+
+
+def minor_version(version):
+    """Return the major.minor part of a Python version string, such as 3.8 for 3.8.18"""
+    return '.'.join(str(version).split('.')[:2])
+
+
+def print_slowest(timings, count):
+    """Print the count patterns with the slowest average search"""
+    if count <= 0 or not timings:
+        return
+    print(f"\nSlowest {min(count, len(timings))} patterns:")
+    print(f"  {'us/search':>10} {'max us':>10}  pattern")
+    for pattern_id, name, pattern, searches, seconds, slowest in timings[:count]:
+        print(f"  {seconds / searches * 1e6:10.1f} {slowest * 1e6:10.1f}  {pattern_id} ({name})")
+
+
+def main():
+    """Main function"""
+    tools_dir = os.path.dirname(os.path.abspath(__file__))
+    repo_root = os.path.dirname(tools_dir)
+    patterns_dir = os.path.join(repo_root, 'patterns')
+    
+    parser = argparse.ArgumentParser(description="Time every pattern against a reference corpus")
+    parser.add_argument('--corpus', default=os.path.join(tools_dir, 'benchmark-corpus.jsonl'),
+                        help="JSONL corpus of texts and response records (default: tools/benchmark-corpus.jsonl)")
+    parser.add_argument('--baseline', default=os.path.join(tools_dir, 'benchmark-baseline.json'),
+                        help="stored throughput baseline (default: tools/benchmark-baseline.json)")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="store this run's throughput as the new baseline instead of comparing")
+    parser.add_argument('--changed', metavar='REVISIONS',
+                        help="enforce the budget on the patterns new or changed in REVISIONS, "
+                             "e.g. origin/master...HEAD")
+    parser.add_argument('--budget-us', type=float, default=DEFAULT_BUDGET_US,
+                        help=f"average microseconds per search a pattern may take (default: {DEFAULT_BUDGET_US:g})")
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION, metavar='PERCENT',
+                        help=f"throughput drop against the baseline that fails the run (default: {DEFAULT_MAX_REGRESSION:g})")
+    parser.add_argument('--top', type=int, default=20,
+                        help="slowest patterns to list (default: 20)")
+    parser.add_argument('--repeats', type=int, default=3,
+                        help="runs of each search, keeping the fastest (default: 3)")
+    parser.add_argument('--rounds', type=int, default=10,
+                        help="corpus rounds of the throughput measurement (default: 10)")
+    parser.add_argument('--json', metavar='FILE',
+                        help="write a JSON summary of the timings and checks to FILE")
+    args = parser.parse_args()
+    
+    corpus = load_corpus(args.corpus)
+    items = [item for input_id, item in corpus]
+    texts = [corpus_text(item) for item in items]
+    corpus_size = sum(len(text) for text in texts)
+    
+    changed = None
+    if args.changed:
+        try:
+            changed = changed_pattern_ids(repo_root, patterns_dir, args.changed)
+        except (OSError, subprocess.CalledProcessError) as e:
+            reason = (getattr(e, 'stderr', '') or str(e)).strip()
+            print(f"Error: Could not list the files changed in {args.changed}: {reason}")
+            return 1
+        except ValueError as e:
+            print(f"Error: Malformed product file: {e}")
+            return 1
+    
+    # Per-pattern timings, of the new or changed patterns only with --changed
+    start = time.perf_counter()
+    timings, stalled = time_patterns(patterns_dir, texts, args.repeats, changed)
+    timings.sort(key=lambda timing: timing[4] / timing[3], reverse=True)
+    print(f"Timed {len(timings)} patterns against {len(texts)} corpus texts ({corpus_size} characters) "
+          f"and their test inputs in {time.perf_counter() - start:.1f}s")
+    print_slowest(timings, args.top)
+    if stalled:
+        print(f"\n{len(stalled)} patterns stalled for more than {PATTERN_STALL_SECONDS:g}s and were stopped:")
+        for pattern_id, name in stalled:
+            print(f"  {pattern_id} ({name})")
+    
+    over_budget = [timing for timing in timings if timing[4] / timing[3] * 1e6 > args.budget_us]
+    failures = []
+    if changed is not None:
+        for pattern_id, name in stalled:
+            failures.append(f"{pattern_id} ({name}) stalled for more than {PATTERN_STALL_SECONDS:g}s")
+    if changed is None:
+        print(f"\n{len(over_budget)} patterns average more than {args.budget_us:g} us per search")
+    else:
+        print(f"\n{len(changed)} new or changed patterns, {len(over_budget)} over the budget of "
+              f"{args.budget_us:g} us per search")
+        for pattern_id, name, pattern, searches, seconds, slowest in over_budget:
+            failures.append(f"{pattern_id} ({name}) averages {seconds / searches * 1e6:.1f} us per search, "
+                            f"over the budget of {args.budget_us:g} us")
+    
+    # Whole-database throughput, normalized by the machine's speed. New or changed patterns that stalled
+    # have already failed the run and would stall it again; the rest of the database is the baseline's.
+    stalled_ids = {pattern_id for pattern_id, name in stalled} if changed is not None else set()
+    pattern_set = PatternSet([pattern_data for pattern_data in load_patterns(patterns_dir)
+                              if pattern_data.pattern_id not in stalled_ids])
+    throughput, calibration, normalized = measure_throughput(pattern_set, items, texts, args.rounds)
+    print(f"\nThroughput: {throughput:.1f} inputs/s ({throughput * corpus_size / len(texts) / 1e6:.2f} MB/s) "
+          f"with {len(pattern_set)} patterns, normalized {normalized:.6f}")
+    
+    measurement = {
+        'version': BASELINE_VERSION,
+        'corpus_hash': file_hash(args.corpus),
+        'throughput': round(throughput, 3),
+        'calibration': round(calibration, 3),
+        'normalized': round(normalized, 9),
+        'patterns': len(pattern_set),
+        'python': platform.python_version(),
+    }
+    regression = None
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(measurement, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+    else:
+        baseline = load_baseline(args.baseline)
+        if baseline is None:
+            print(f"No baseline at {args.baseline}, skipping the throughput check")
+        elif baseline.get('corpus_hash') != measurement['corpus_hash']:
+            print("The corpus changed since the baseline was stored, skipping the throughput check")
+        elif minor_version(baseline.get('python')) != minor_version(measurement['python']):
+            print(f"Warning: The baseline was recorded with Python {baseline.get('python')}, this is Python "
+                  f"{measurement['python']}; skipping the throughput check")
+        else:
+            regression = (1 - normalized / baseline['normalized']) * 100
+            print(f"Baseline normalized throughput {baseline['normalized']:.6f}, change {-regression:+.1f}%")
+            if regression > args.max_regression:
+                failures.append(f"normalized throughput dropped {regression:.1f}% below the baseline, "
+                                f"more than {args.max_regression:g}%")
+    
+    if args.json:
+        summary = {
+            'patterns': len(timings),
+            'corpus_texts': len(texts),
+            'budget_us': args.budget_us,
+            'changed': sorted(changed) if changed is not None else None,
+            'stalled': [{'pattern_id': pattern_id, 'name': name} for pattern_id, name in stalled],
+            'over_budget': [{'pattern_id': pattern_id, 'name': name,
+                             'us_per_search': round(seconds / searches * 1e6, 3)}
+                            for pattern_id, name, pattern, searches, seconds, slowest in over_budget],
+            'slowest': [{'pattern_id': pattern_id, 'name': name, 'searches': searches,
+                         'us_per_search': round(seconds / searches * 1e6, 3), 'max_us': round(slowest * 1e6, 3)}
+                        for pattern_id, name, pattern, searches, seconds, slowest in timings[:args.top]],
+            'throughput': measurement,
+            'regression_percent': round(regression, 3) if regression is not None else None,
+            'failures': failures,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+            f.write('\n')
+    
+    if failures:
+        print("\nPerformance check failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    
+    print("\nPerformance check passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
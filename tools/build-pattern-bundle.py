@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Build the single-file pattern bundle used by the tools for fast loading
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from pattern_bundle import build_bundle, bundle_header, default_bundle_path, is_fresh
+
+
+def main():
+    """Main function"""
+    # Define paths
+    workspace_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    patterns_dir = os.path.join(workspace_dir, 'patterns')
+    
+    parser = argparse.ArgumentParser(description="Pack patterns/by-vendor into a single bundle file")
+    parser.add_argument('--output', default=default_bundle_path(patterns_dir),
+                        help="bundle path (default: build/patterns.bundle)")
+    parser.add_argument('--check', action='store_true',
+                        help="only report whether the bundle is up to date (exit code 1 if not)")
+    parser.add_argument('--full', action='store_true',
+                        help="reprocess every product file instead of only the ones that changed")
+    args = parser.parse_args()
+    
+    if args.check:
+        header = bundle_header(args.output)
+        if header is None:
+            print(f"No usable bundle at {args.output}")
+            return 1
+        if not is_fresh(header, patterns_dir):
+            print(f"Bundle {args.output} is stale")
+            return 1
+        print(f"Bundle {args.output} is up to date ({header['content_hash'][:12]})")
+        return 0
+    
+    print("Building pattern bundle...")
+    start = time.time()
+    header, reprocessed = build_bundle(patterns_dir, args.output, full=args.full)
+    
+    print(f"Reprocessed {len(reprocessed)} changed product files")
+    print(f"Packed {header['patterns']} patterns from {header['products']} product files")
+    print(f"Manifest: {len(header['index']['vendor_id'])} vendors, {len(header['index']['category'])} categories, "
+          f"{len(header['index']['tags'])} tags")
+    print(f"Content hash: {header['content_hash']}")
+    print(f"Bundle written to {args.output} ({os.path.getsize(args.output)} bytes) "
+          f"in {time.time() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Build the SQLite pattern catalog that tools can query instead of reading JSON
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from pattern_catalog import build_catalog, default_catalog_path, open_catalog
+
+
+def main():
+    """Main function"""
+    # Define paths
+    workspace_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    patterns_dir = os.path.join(workspace_dir, 'patterns')
+    
+    parser = argparse.ArgumentParser(description="Load patterns/by-vendor into an SQLite catalog")
+    parser.add_argument('--output', default=default_catalog_path(patterns_dir),
+                        help="catalog path (default: build/patterns.db)")
+    parser.add_argument('--check', action='store_true',
+                        help="only report whether the catalog is up to date (exit code 1 if not)")
+    parser.add_argument('--full', action='store_true',
+                        help="rebuild from every product file instead of only the changed ones")
+    args = parser.parse_args()
+    
+    if args.check:
+        conn = open_catalog(patterns_dir, args.output)
+        if conn is None:
+            print(f"Catalog {args.output} is missing or stale")
+            return 1
+        conn.close()
+        print(f"Catalog {args.output} is up to date")
+        return 0
+    
+    print("Building pattern catalog...")
+    start = time.time()
+    product_count, pattern_count, reprocessed = build_catalog(patterns_dir, args.output, full=args.full)
+    
+    print(f"Reprocessed {len(reprocessed)} changed product files")
+    print(f"Loaded {pattern_count} patterns from {product_count} product files")
+    print(f"Catalog written to {args.output} ({os.path.getsize(args.output)} bytes) "
+          f"in {time.time() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Build state shared by the tools that derive artifacts from the pattern files
+
+The state file, build/build-state.json by default, records for every
+artifact (the pattern bundle, the catalog) the size, mtime and SHA-256 of
+each product file it was last built from:
+
+    {"version": 1,
+     "artifacts": {"bundle": {"output": "...", "content_hash": "...",
+                              "files": {"by-vendor/apache/httpd.json": [size, mtime_ns, sha256]}}}}
+
+A rebuild compares the product files on disk against that record and only
+reprocesses the ones whose content changed. A file is only hashed again when
+its size or mtime changed, so a rebuild costs one stat per file plus work
+proportional to the change. content_hash identifies the set of contents an
+artifact was built from, so a builder can tell whether the artifact on disk
+is still the one the state describes.
+"""
+
+import hashlib
+import json
+import os
+
+STATE_VERSION = 1
+
+
+def default_state_path(patterns_dir):
+    """Return where the build state for a patterns directory is kept by default"""
+    return os.path.join(os.path.dirname(os.path.abspath(patterns_dir)), 'build', 'build-state.json')
+
+
+def load_state(state_path):
+    """Load a build state file, or return an empty state if it is missing or unusable"""
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {'version': STATE_VERSION, 'artifacts': {}}
+    
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        return {'version': STATE_VERSION, 'artifacts': {}}
+    state.setdefault('artifacts', {})
+    return state
+
+
+def save_state(state_path, state):
+    """Write a build state file atomically"""
+    os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+    temp_path = state_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        f.write(json.dumps(state, sort_keys=True))
+    os.replace(temp_path, state_path)
+
+
+def file_hash(path):
+    """Return the SHA-256 of a file's contents"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def scan_sources(patterns_dir, product_files, previous=None):
+    """Return {relative path: [size, mtime_ns, sha256]} for the given product files
+    
+    Hashes are taken from previous, a "files" record of the state, for files
+    whose size and mtime did not change.
+    """
+    previous = previous or {}
+    sources = {}
+    
+    for relpath in product_files:
+        path = os.path.join(patterns_dir, relpath)
+        stat = os.stat(path)
+        known = previous.get(relpath)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            digest = known[2]
+        else:
+            digest = file_hash(path)
+        sources[relpath] = [stat.st_size, stat.st_mtime_ns, digest]
+    
+    return sources
+
+
+def diff_sources(previous, current):
+    """Return (changed, removed) relative paths between two "files" records
+    
+    changed lists new files and files whose content hash differs.
+    """
+    changed = sorted(relpath for relpath, entry in current.items()
+                     if relpath not in previous or previous[relpath][2] != entry[2])
+    removed = sorted(relpath for relpath in previous if relpath not in current)
+    return changed, removed
+
+
+def sources_digest(sources):
+    """Return one SHA-256 over the paths and content hashes of a "files" record"""
+    digest = hashlib.sha256()
+    for relpath in sorted(sources):
+        digest.update(f"{relpath}\0{sources[relpath][2]}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def recorded_stats(sources):
+    """Return {relative path: [size, mtime_ns]} from a "files" record"""
+    return {relpath: entry[:2] for relpath, entry in sources.items()}
+
+
+def previous_build(state, artifact, output):
+    """Return the state's record for an artifact if it describes output, else None"""
+    record = state['artifacts'].get(artifact)
+    if record is None or record.get('output') != os.path.abspath(output):
+        return None
+    return record
+
+
+def record_build(state, artifact, output, sources):
+    """Record in state that artifact was built at output from sources"""
+    state['artifacts'][artifact] = {
+        'output': os.path.abspath(output),
+        'content_hash': sources_digest(sources),
+        'files': sources
+    }
@@ -129,6 +129,19 @@ def extract_patterns_from_plugin(plugin_path):
         'patterns': patterns
     }
 
+def build_scope(pattern):
+    """Build the scope of a converted pattern from its WhatWeb :search and :status"""
+    scope = {}
+    
+    search = pattern.get('search', '').strip().lower()
+    if search in ('all', 'body', 'headers') or re.fullmatch(r'headers\[[^\]]+\]', search):
+        scope['search'] = search
+    
+    if 'status' in pattern:
+        scope['status'] = int(pattern['status'])
+    
+    return scope or None
+
 def convert_to_regex_exchange_format(whatweb_data):
     """Convert WhatWeb data to Regex-Intelligence-Exchange format"""
     if not whatweb_data or not whatweb_data['patterns']:
@@ -220,6 +233,11 @@ def convert_to_regex_exchange_format(whatweb_data):
             # Skip patterns that don't have recognizable types
             continue
         
+        # Keep where WhatWeb searches so the matcher can skip other parts of a response
+        scope = build_scope(pattern)
+        if scope:
+            pattern_entry['scope'] = scope
+        
         # Add test cases if possible
         if 'text' in pattern:
             pattern_entry['metadata']['test_cases'] = [{
@@ -11,6 +11,9 @@ import os
 from pathlib import Path
 from collections import defaultdict
 
+from pattern_bundle import read_product
+from pattern_matcher.loader import preload_products
+
 def find_pattern_files(root_dir):
     """Find all pattern files in the repository."""
     pattern_files = []
@@ -23,7 +26,7 @@ def find_pattern_files(root_dir):
     
     return pattern_files
 
-def analyze_patterns(pattern_files):
+def analyze_patterns(pattern_files, products=None):
     """Analyze all patterns and generate statistics."""
     # Statistics counters
     total_patterns = 0
@@ -35,12 +38,11 @@ def analyze_patterns(pattern_files):
     
     # Process each pattern file
     for pattern_file in pattern_files:
-        with open(pattern_file, 'r') as f:
-            try:
-                pattern_data = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"Error parsing {pattern_file}: {e}")
-                continue
+        try:
+            pattern_data = read_product(pattern_file, products)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing {pattern_file}: {e}")
+            continue
         
         # Extract vendor and product information
         vendor = pattern_data.get('vendor', 'unknown')
@@ -144,7 +146,7 @@ def main():
     print(f"Found {len(pattern_files)} pattern files to analyze")
     
     # Analyze patterns
-    stats = analyze_patterns(pattern_files)
+    stats = analyze_patterns(pattern_files, preload_products(os.path.join(repo_root, 'patterns'), metadata=True))
     
     # Generate report
     report = generate_report(stats)
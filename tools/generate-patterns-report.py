@@ -7,6 +7,22 @@ import os
 import json
 from collections import defaultdict
 
+from pattern_bundle import read_product
+from pattern_catalog import catalog_product_counts
+from pattern_matcher.loader import preload_products
+
+
+def count_product(data):
+    """Return (vendor, product, category, generic, version-specific) pattern counts of a product file"""
+    all_versions_count = len(data.get('all_versions', []))
+    version_patterns_count = 0
+    versions = data.get('versions', {})
+    for version_patterns_list in versions.values():
+        version_patterns_count += len(version_patterns_list)
+    
+    return (data.get('vendor', 'Unknown'), data.get('product', 'Unknown'), data.get('category', 'Unknown'),
+            all_versions_count, version_patterns_count)
+
 
 def generate_patterns_report(patterns_dir):
     """Generate a comprehensive report of all patterns"""
@@ -33,13 +49,17 @@ def generate_patterns_report(patterns_dir):
     print("Generating Patterns Report...")
     print("=" * 50)
     
+    # Take the counts from the pattern catalog when it is fresh
+    counts = catalog_product_counts(patterns_dir)
+    products = preload_products(patterns_dir) if not counts else {}
+    
     # Walk through vendor directories
     for vendor in os.listdir(by_vendor_dir):
         vendor_path = os.path.join(by_vendor_dir, vendor)
         
         if not os.path.isdir(vendor_path) or vendor == 'README.md':
             continue
-            
+        
         total_vendors += 1
         vendor_patterns = 0
         vendor_products = 0
@@ -49,26 +69,18 @@ def generate_patterns_report(patterns_dir):
         for product_file in os.listdir(vendor_path):
             if not product_file.endswith('.json'):
                 continue
-                
+            
             product_path = os.path.join(vendor_path, product_file)
             vendor_products += 1
             total_products += 1
             
             try:
-                with open(product_path, 'r') as f:
-                    data = json.load(f)
-                
-                # Extract information
-                product_name = data.get('product', 'Unknown')
-                category = data.get('category', 'Unknown')
-                vendor_name = data.get('vendor', 'Unknown')
+                product_counts = counts.get(f"by-vendor/{vendor}/{product_file}")
+                if product_counts is None:
+                    product_counts = count_product(read_product(product_path, products))
                 
-                # Count patterns
-                all_versions_count = len(data.get('all_versions', []))
-                version_patterns_count = 0
-                versions = data.get('versions', {})
-                for version_patterns_list in versions.values():
-                    version_patterns_count += len(version_patterns_list)
+                # Extract information and pattern counts
+                vendor_name, product_name, category, all_versions_count, version_patterns_count = product_counts
                 
                 product_patterns = all_versions_count + version_patterns_count
                 vendor_patterns += product_patterns
@@ -95,7 +107,7 @@ def generate_patterns_report(patterns_dir):
                 
                 report_data['vendors'][vendor]['total_patterns'] += product_patterns
                 report_data['vendors'][vendor]['categories'].add(category)
-                
+            
             except Exception as e:
                 print(f"Error reading {product_path}: {e}")
         
@@ -4,9 +4,11 @@ List all vendors and products in the new by-vendor structure
 """
 
 import os
-import json
 from pathlib import Path
 
+from pattern_bundle import read_product
+from pattern_matcher.loader import preload_products
+
 
 def list_vendors_products(patterns_dir):
     """List all vendors and products in the by-vendor structure"""
@@ -19,6 +21,8 @@ def list_vendors_products(patterns_dir):
     print("Vendors and Products in by-vendor structure:")
     print("=" * 50)
     
+    bundled = preload_products(patterns_dir)
+    
     # Get all vendor directories
     vendors = [d for d in os.listdir(by_vendor_dir) 
                if os.path.isdir(os.path.join(by_vendor_dir, d)) and d != 'README.md']
@@ -37,8 +41,7 @@ def list_vendors_products(patterns_dir):
         for product in products:
             product_path = os.path.join(vendor_path, product)
             try:
-                with open(product_path, 'r') as f:
-                    data = json.load(f)
+                data = read_product(product_path, bundled)
                 
                 product_name = data.get('product', 'Unknown')
                 category = data.get('category', 'Unknown')
@@ -1,167 +1,284 @@
 #!/usr/bin/env python3
 """
 Simple pattern matcher that demonstrates using patterns from the new structure
+
+The matching itself lives in the pattern_matcher package; this script is its
+command-line interface.
 """
 
 import os
+import argparse
 import json
-import re
 import sys
-from pathlib import Path
+import tracemalloc
+
+from pattern_bundle import content_version, pattern_metadata
+from pattern_matcher.defaults import (DEFAULT_CHUNK_SIZE, DEFAULT_MAX_STRIKES, DEFAULT_RELOAD_INTERVAL,
+                                      DEFAULT_SERVE_ADDRESS, DEFAULT_WINDOW_SIZE)
+from pattern_matcher.guard import GuardedMatcher, load_quarantine, save_quarantine
+from pattern_matcher.loader import load_patterns, pattern_key
+from pattern_matcher.parallel import parallel_match_batch
+from pattern_matcher.pattern_set import PatternSet, check_record, report_failed
 
 
-def load_patterns(patterns_dir, vendor=None, product=None):
-    """Load patterns from the new by-vendor structure"""
-    by_vendor_dir = os.path.join(patterns_dir, 'by-vendor')
-    patterns = []
+def read_texts(path):
+    """Yield one text per line from a file, or from stdin when path is '-'"""
+    if path == '-':
+        for line in sys.stdin:
+            yield line.rstrip('\r\n')
+        return
     
-    if not os.path.exists(by_vendor_dir):
-        print("Error: by-vendor directory not found")
-        return patterns
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            yield line.rstrip('\r\n')
+
+
+def read_records(path):
+    """Yield (input_id, item) pairs from a JSONL file, or from stdin when path is '-'
     
-    # If specific vendor/product specified, load only those
-    if vendor and product:
-        product_path = os.path.join(by_vendor_dir, vendor, f"{product}.json")
-        if os.path.exists(product_path):
+    Each item is a plain string or a response record for match_input().
+    Records without an "id" are identified by their line number. Lines that
+    are not valid JSON, and records that check_record() rejects, are
+    reported on stderr and skipped.
+    """
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8', errors='replace')
+    try:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
             try:
-                with open(product_path, 'r') as f:
-                    data = json.load(f)
-                patterns.extend(extract_patterns(data))
-            except Exception as e:
-                print(f"Error loading {product_path}: {e}")
-        else:
-            print(f"Product file not found: {product_path}")
-    elif vendor:
-        # Load all products for a vendor
-        vendor_path = os.path.join(by_vendor_dir, vendor)
-        if os.path.exists(vendor_path):
-            for product_file in os.listdir(vendor_path):
-                if product_file.endswith('.json'):
-                    product_path = os.path.join(vendor_path, product_file)
-                    try:
-                        with open(product_path, 'r') as f:
-                            data = json.load(f)
-                        patterns.extend(extract_patterns(data))
-                    except Exception as e:
-                        print(f"Error loading {product_path}: {e}")
-        else:
-            print(f"Vendor directory not found: {vendor_path}")
-    else:
-        # Load all patterns
-        for vendor_name in os.listdir(by_vendor_dir):
-            vendor_path = os.path.join(by_vendor_dir, vendor_name)
-            if os.path.isdir(vendor_path) and vendor_name != 'README.md':
-                for product_file in os.listdir(vendor_path):
-                    if product_file.endswith('.json'):
-                        product_path = os.path.join(vendor_path, product_file)
-                        try:
-                            with open(product_path, 'r') as f:
-                                data = json.load(f)
-                            patterns.extend(extract_patterns(data))
-                        except Exception as e:
-                            print(f"Error loading {product_path}: {e}")
-    
-    return patterns
-
-
-def extract_patterns(data):
-    """Extract all patterns from a product file"""
-    patterns = []
-    
-    # Extract all_versions patterns
-    for pattern_data in data.get('all_versions', []):
-        patterns.append({
-            'vendor': data.get('vendor', 'Unknown'),
-            'product': data.get('product', 'Unknown'),
-            'name': pattern_data.get('name', 'Unknown'),
-            'pattern': pattern_data.get('pattern', ''),
-            'version_group': pattern_data.get('version_group', 0),
-            'priority': pattern_data.get('priority', 0),
-            'confidence': pattern_data.get('confidence', 0.0),
-            'category': data.get('category', 'Unknown')
-        })
-    
-    # Extract version-specific patterns
-    versions = data.get('versions', {})
-    for version_range, version_patterns in versions.items():
-        for pattern_data in version_patterns:
-            patterns.append({
-                'vendor': data.get('vendor', 'Unknown'),
-                'product': data.get('product', 'Unknown'),
-                'name': pattern_data.get('name', 'Unknown'),
-                'pattern': pattern_data.get('pattern', ''),
-                'version_group': pattern_data.get('version_group', 0),
-                'priority': pattern_data.get('priority', 0),
-                'confidence': pattern_data.get('confidence', 0.0),
-                'category': data.get('category', 'Unknown'),
-                'version_range': version_range
-            })
-    
-    return patterns
-
-
-def match_patterns(patterns, text):
-    """Match patterns against text and return results"""
-    results = []
-    
-    for pattern_data in patterns:
-        try:
-            regex = re.compile(pattern_data['pattern'])
-            match = regex.search(text)
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping invalid JSON on line {line_number}: {e}", file=sys.stderr)
+                continue
             
-            if match:
-                # Extract version if version_group is specified
-                version = None
-                if pattern_data['version_group'] > 0 and pattern_data['version_group'] <= len(match.groups()):
-                    version = match.group(pattern_data['version_group'])
-                
-                results.append({
-                    'vendor': pattern_data['vendor'],
-                    'product': pattern_data['product'],
-                    'name': pattern_data['name'],
-                    'matched_text': match.group(0),
-                    'version': version,
-                    'priority': pattern_data['priority'],
-                    'confidence': pattern_data['confidence'],
-                    'category': pattern_data['category']
-                })
-        except re.error as e:
-            print(f"Invalid regex pattern: {pattern_data['pattern']} - {e}")
-    
-    # Sort by priority (highest first)
-    results.sort(key=lambda x: x['priority'], reverse=True)
-    return results
+            if isinstance(record, str):
+                yield line_number, record
+            elif isinstance(record, dict):
+                try:
+                    check_record(record)
+                except ValueError as e:
+                    print(f"Skipping line {line_number}: {e}", file=sys.stderr)
+                    continue
+                yield record.get('id', line_number), record
+            else:
+                print(f"Skipping line {line_number}: expected a JSON object or string", file=sys.stderr)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def write_jsonl(records):
+    """Write one JSON result record per line, flushing after each"""
+    for record in records:
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+
+
+def measure_memory(patterns_dir, vendor=None, product=None, exclude=None, prefilter=True, **filters):
+    """Load and compile patterns like PatternSet.load() while tracing allocations
+    
+    Returns (pattern_set, footprint) where footprint gives the bytes still
+    held by the loaded records and by the compiled set, in total and per
+    pattern.
+    """
+    tracemalloc.start()
+    try:
+        patterns = load_patterns(patterns_dir, vendor, product, **filters)
+        if exclude:
+            patterns = [pattern_data for pattern_data in patterns if pattern_key(pattern_data) not in exclude]
+        records = tracemalloc.get_traced_memory()[0]
+        pattern_set = PatternSet(patterns, prefilter)
+        total = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    
+    return pattern_set, {
+        'patterns': len(patterns),
+        'records': records,
+        'compiled': total - records,
+        'per_pattern': total / len(patterns) if patterns else 0.0
+    }
 
 
 def main():
     """Main function"""
-    if len(sys.argv) < 2:
-        print("Usage: python pattern-matcher.py <text-to-match> [vendor] [product]")
-        print("Examples:")
-        print("  python pattern-matcher.py 'Server: Apache/2.4.41 (Ubuntu)'")
-        print("  python pattern-matcher.py 'Server: Apache/2.4.41 (Ubuntu)' apache httpd")
-        print("  python pattern-matcher.py 'Server: nginx/1.18.0' f5-networks nginx")
-        return
+    parser = argparse.ArgumentParser(
+        description="Match text against the pattern database",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""Examples:
+  python pattern-matcher.py 'Server: Apache/2.4.41 (Ubuntu)'
+  python pattern-matcher.py 'Server: Apache/2.4.41 (Ubuntu)' apache httpd
+  python pattern-matcher.py 'Server: nginx/1.18.0' f5-networks nginx""")
+    parser.add_argument('text', nargs='?', help="text to match")
+    parser.add_argument('vendor', nargs='?', help="only load patterns for this vendor")
+    parser.add_argument('product', nargs='?', help="only load patterns for this product")
+    parser.add_argument('--vendor', dest='vendor_option', metavar='VENDOR',
+                        help="only load patterns for this vendor (for use with --batch)")
+    parser.add_argument('--product', dest='product_option', metavar='PRODUCT',
+                        help="only load patterns for this product (for use with --batch)")
+    parser.add_argument('--category',
+                        help="only load patterns for products in this category, e.g. cms")
+    parser.add_argument('--tag', action='append', dest='tags', metavar='TAG',
+                        help="only load patterns with this tag (may be repeated)")
+    parser.add_argument('--catalog', action='store_true',
+                        help="query patterns from the SQLite catalog built by build-pattern-catalog.py")
+    parser.add_argument('--where', metavar='CONDITION',
+                        help="only load patterns matching this SQL condition on the catalog, "
+                             "e.g. 'patterns.version_group > 0 AND patterns.priority > 100'")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="match every line of FILE ('-' for stdin) instead of a single text")
+    parser.add_argument('--jsonl', metavar='FILE',
+                        help="match JSONL records from FILE ('-' for stdin) and write JSONL results to stdout")
+    parser.add_argument('--file', metavar='PATH',
+                        help="scan a (possibly very large) file through mmap instead of a text argument")
+    parser.add_argument('--window-size', type=int, default=DEFAULT_WINDOW_SIZE, metavar='BYTES',
+                        help=f"window size used with --file (default: {DEFAULT_WINDOW_SIZE})")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"number of inputs processed per chunk in batch mode (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help="match batch inputs on N worker processes (default: 1)")
+    parser.add_argument('--unordered', action='store_true',
+                        help="with --workers, print results as chunks complete instead of in input order")
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS',
+                        help="abort any regex search running longer than SECONDS (runs matching in a guarded worker)")
+    parser.add_argument('--max-strikes', type=int, default=DEFAULT_MAX_STRIKES, metavar='N',
+                        help=f"quarantine a pattern after N budget overruns (default: {DEFAULT_MAX_STRIKES})")
+    parser.add_argument('--quarantine', metavar='FILE',
+                        help="skip the patterns listed in FILE and, with --time-budget, add newly quarantined ones")
+    parser.add_argument('--no-prefilter', action='store_true',
+                        help="run every regex instead of prefiltering on required literals")
+    parser.add_argument('--details', action='store_true',
+                        help="also print the description and tags of each matched pattern")
+    parser.add_argument('--memory', action='store_true',
+                        help="report the memory held by the loaded patterns")
+    parser.add_argument('--no-bundle', action='store_true',
+                        help="read the JSON pattern files even if a fresh pattern bundle exists")
+    parser.add_argument('--serve', nargs='?', const=DEFAULT_SERVE_ADDRESS, metavar='ADDRESS',
+                        help="run as a daemon answering match requests on a host:port or Unix socket path "
+                             f"(default: {DEFAULT_SERVE_ADDRESS})")
+    parser.add_argument('--watch', nargs='?', type=float, const=DEFAULT_RELOAD_INTERVAL, metavar='SECONDS',
+                        help="with --serve, reload changed product files, checking every SECONDS "
+                             f"(default: {DEFAULT_RELOAD_INTERVAL})")
+    args = parser.parse_args()
+    
+    if [args.text, args.batch, args.jsonl, args.file, args.serve].count(None) != 4:
+        parser.error("give exactly one of a text to match, --batch FILE, --jsonl FILE, --file PATH or --serve")
+    if args.time_budget is not None and (args.workers > 1 or args.file or args.serve):
+        parser.error("--time-budget cannot be combined with --workers, --file or --serve")
+    if args.serve and args.workers > 1:
+        parser.error("--serve cannot be combined with --workers")
+    if args.watch is not None and (not args.serve or args.catalog or args.where or args.memory):
+        parser.error("--watch needs --serve and cannot be combined with --catalog, --where or --memory")
+    if args.serve:
+        # The HTTP server modules are only imported when the daemon is started
+        from pattern_matcher.server import check_address, serve
+        
+        try:
+            check_address(args.serve)
+        except ValueError as e:
+            parser.error(str(e))
     
-    text = sys.argv[1]
-    vendor = sys.argv[2] if len(sys.argv) > 2 else None
-    product = sys.argv[3] if len(sys.argv) > 3 else None
+    text = args.text
+    vendor = args.vendor_option or args.vendor
+    product = args.product_option or args.product
     
     # Define paths
     workspace_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     patterns_dir = os.path.join(workspace_dir, 'patterns')
     
-    print(f"Matching patterns against: '{text}'")
-    print("=" * 50)
+    details = patterns_dir if args.details else None
+    
+    # Keep stdout clean for result records in JSONL mode
+    out = sys.stderr if args.jsonl else sys.stdout
+    
+    if args.jsonl:
+        print(f"Matching patterns against records of: {args.jsonl}", file=out)
+        inputs = read_records(args.jsonl)
+        show = write_jsonl
+    elif args.batch:
+        print(f"Matching patterns against lines of: {args.batch}", file=out)
+        inputs = read_texts(args.batch)
+        show = print_batch
+    elif args.file:
+        print(f"Scanning file: {args.file}", file=out)
+        inputs = None
+    elif args.serve:
+        print("Starting matching daemon", file=out)
+        inputs = None
+    else:
+        print(f"Matching patterns against: '{text}'", file=out)
+        inputs = None
+    print("=" * 50, file=out)
+    
+    options = {'prefilter': not args.no_prefilter, 'use_bundle': not args.no_bundle, 'category': args.category,
+               'tags': args.tags, 'use_catalog': args.catalog, 'where': args.where}
+    quarantined = load_quarantine(args.quarantine) if args.quarantine else set()
+    if args.time_budget is None:
+        options['exclude'] = quarantined
     
-    # Load patterns
-    patterns = load_patterns(patterns_dir, vendor, product)
-    print(f"Loaded {len(patterns)} patterns")
+    if inputs is not None and args.workers > 1:
+        print(f"Matching on {args.workers} worker processes", file=out)
+        show(parallel_match_batch(inputs, args.workers, patterns_dir, vendor, product,
+                                  args.chunk_size, ordered=not args.unordered, **options))
+        return
+    
+    # Load and compile patterns
+    reloader = None
+    if args.watch is not None:
+        from pattern_matcher.reload import PatternReloader
+        
+        reloader = PatternReloader(patterns_dir, vendor, product, args.category, args.tags, options['exclude'],
+                                   options['prefilter'], options['use_bundle'], args.watch)
+        pattern_set = reloader.pattern_set
+    elif args.memory:
+        pattern_set, footprint = measure_memory(patterns_dir, vendor, product, **options)
+    else:
+        pattern_set = PatternSet.load(patterns_dir, vendor, product, **options)
+    report_failed(pattern_set, file=out)
+    stats = pattern_set.stats()
+    print(f"Loaded {len(pattern_set) + len(pattern_set.failed)} patterns "
+          f"({stats['literal']} literal, {stats['regex']} regex, {stats['failed']} failed)", file=out)
+    if args.memory:
+        print(f"Memory: {footprint['per_pattern']:.0f} bytes per pattern "
+              f"({footprint['records']} bytes of records, {footprint['compiled']} bytes compiled)", file=out)
+    
+    if args.serve:
+        version = reloader.version if reloader else content_version(patterns_dir)
+        serve(pattern_set, args.serve, version, reloader, file=out)
+        return
+    
+    # Without workers, stream --jsonl records one at a time so each result is written as soon as it arrives
+    chunk_size = 1 if args.jsonl else args.chunk_size
+    
+    if args.time_budget is not None:
+        with GuardedMatcher(pattern_set, args.time_budget, args.max_strikes, quarantined) as guard:
+            if inputs is not None:
+                show(guard.match_batch(inputs, chunk_size))
+            else:
+                print_results(guard.match(text), details)
+            report_quarantine(guard, args.quarantine, file=out)
+        return
+    
+    if inputs is not None:
+        show(pattern_set.match_batch(inputs, chunk_size))
+        return
     
     # Match patterns
-    results = match_patterns(patterns, text)
+    if args.file:
+        results = pattern_set.scan_file(args.file, args.window_size)
+    else:
+        results = pattern_set.match(text)
+    print_results(results, details)
+
+
+def print_results(results, patterns_dir=None):
+    """Print the results for a single text
     
-    # Display results
+    With patterns_dir, each result's description and tags are looked up by
+    pattern ID and printed too.
+    """
     if results:
         print(f"\nFound {len(results)} matching patterns:")
         for result in results:
@@ -174,9 +291,44 @@ def main():
             print(f"Priority: {result['priority']}")
             print(f"Confidence: {result['confidence']:.2f}")
             print(f"Category: {result['category']}")
+            if patterns_dir and result.get('pattern_id'):
+                metadata = pattern_metadata(patterns_dir, result['pattern_id'])
+                print(f"Description: {metadata.get('description', '')}")
+                print(f"Tags: {', '.join(metadata.get('tags', []))}")
     else:
         print("\nNo matching patterns found.")
 
 
+def report_quarantine(guard, path=None, file=None):
+    """Print the guard's budget overruns and merge its quarantine list into path"""
+    report = guard.quarantine_report()
+    print(f"\n{guard.timeouts} searches exceeded the time budget, "
+          f"{len(report)} patterns quarantined", file=file)
+    for entry in report:
+        print(f"  {entry['vendor']} {entry['product']}: {entry['name']} ({entry['pattern']})", file=file)
+    if path:
+        save_quarantine(path, report)
+        print(f"Quarantine list saved to: {path}", file=file)
+
+
+def print_batch(records):
+    """Print one summary block per input of a batch run"""
+    inputs = 0
+    matched = 0
+    
+    for record in records:
+        inputs += 1
+        results = record['results']
+        print(f"\n[{record['id']}] {len(results)} matching patterns")
+        if results:
+            matched += 1
+        for result in results:
+            version = f" {result['version']}" if result['version'] else ""
+            print(f"  {result['vendor']} {result['product']}{version} "
+                  f"({result['name']}, priority {result['priority']})")
+    
+    print(f"\nMatched {matched} of {inputs} inputs")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
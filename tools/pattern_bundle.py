@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Single-file pattern bundle shared by the tools
+
+A bundle packs every product file under patterns/by-vendor into one file so
+tools can load the whole database with one read instead of walking and
+parsing 1,500+ JSON files. The layout is:
+    
+    MAGIC | header length (uint32, little endian) | header (JSON) | body
+
+The header records the schema version, a content hash of the source files
+(see build_state.sources_digest()) and the size and mtime of every source
+file, which is what freshness checks compare against. The body holds two marshal slices per product file: the
+match section, which is the product data with each pattern's metadata cut
+down to its tags, and the zlib-compressed metadata section, which lists
+the full metadata of each pattern. All match sections come first and are
+left uncompressed, so loading patterns for matching is one marshal.loads()
+per product and never touches test cases or descriptions. The header's manifest gives the offsets and lengths of
+each product's slices together with its vendor_id, product_id, category and
+pattern tags, and its index maps each of those values to manifest entries,
+so a loader can read only the products it needs. marshal is tied to the
+Python version, so a bundle written by another version counts as stale.
+
+A pattern is identified by "<relative path>#<position>", its position being
+its place in iter_product_patterns() order; pattern_metadata() fetches the
+metadata for such an ID.
+"""
+
+import json
+import marshal
+import os
+import struct
+import sys
+import zlib
+from datetime import datetime, timezone
+
+from build_state import (default_state_path, diff_sources, load_state, previous_build, record_build,
+                         recorded_stats, save_state, scan_sources, sources_digest)
+
+MAGIC = b'RIEBNDL\0'
+SCHEMA_VERSION = 3
+HEADER_LENGTH = struct.Struct('<I')
+INDEX_KEYS = ('vendor_id', 'product_id', 'category', 'tags')
+
+
+def default_bundle_path(patterns_dir):
+    """Return where the bundle for a patterns directory is built by default"""
+    return os.path.join(os.path.dirname(os.path.abspath(patterns_dir)), 'build', 'patterns.bundle')
+
+
+def find_product_files(patterns_dir):
+    """Return the relative paths of all product files, sorted"""
+    by_vendor_dir = os.path.join(patterns_dir, 'by-vendor')
+    product_files = []
+    
+    if not os.path.exists(by_vendor_dir):
+        return product_files
+    
+    for vendor_entry in os.scandir(by_vendor_dir):
+        if not vendor_entry.is_dir():
+            continue
+        for product_entry in os.scandir(vendor_entry.path):
+            if product_entry.name.endswith('.json') and product_entry.is_file():
+                product_files.append(f"by-vendor/{vendor_entry.name}/{product_entry.name}")
+    
+    product_files.sort()
+    return product_files
+
+
+def source_stats(patterns_dir, product_files):
+    """Return {relative path: [size, mtime_ns]} for the given product files"""
+    stats = {}
+    for relpath in product_files:
+        stat = os.stat(os.path.join(patterns_dir, relpath))
+        stats[relpath] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def previous_slices(bundle_path, previous):
+    """Return (file, body start, {relative path: manifest entry}) of the bundle a build state describes
+    
+    Returns None if there is no such record, or if the bundle on disk is
+    missing, unusable or not the one the record was made for.
+    """
+    if previous is None or not os.path.exists(bundle_path):
+        return None
+    
+    f = open(bundle_path, 'rb')
+    header = read_header(f)
+    if header is None or header.get('content_hash') != previous.get('content_hash'):
+        f.close()
+        return None
+    return f, f.tell(), {entry['path']: entry for entry in header['manifest']}
+
+
+def build_bundle(patterns_dir, bundle_path=None, state_path=None, full=False):
+    """Pack all product files into a bundle and return (header, reprocessed paths)
+    
+    Unless full is set, the slices of product files whose content has not
+    changed since the bundle was last built, according to the build state
+    file, are copied from the existing bundle and only the other files are
+    parsed. Files that are not valid JSON are reported and left out of the
+    body, but still recorded as sources so the bundle is not considered
+    stale because of them.
+    """
+    bundle_path = bundle_path or default_bundle_path(patterns_dir)
+    state_path = state_path or default_state_path(patterns_dir)
+    state = load_state(state_path)
+    previous = None if full else previous_build(state, 'bundle', bundle_path)
+    sources = scan_sources(patterns_dir, find_product_files(patterns_dir), previous['files'] if previous else None)
+    changed = set(diff_sources(previous['files'] if previous else {}, sources)[0])
+    old = previous_slices(bundle_path, previous)
+    
+    manifest = []
+    slices = []
+    metadata_slices = []
+    reprocessed = []
+    offset = 0
+    pattern_count = 0
+    
+    try:
+        for relpath in sources:
+            old_entry = old[2].get(relpath) if old is not None and relpath not in changed else None
+            if old_entry is not None:
+                # Unchanged since the last build: copy its slices as they are
+                f, body_start = old[:2]
+                f.seek(body_start + old_entry['offset'])
+                data_slice = f.read(old_entry['length'])
+                f.seek(body_start + old_entry['metadata_offset'])
+                metadata_slice = f.read(old_entry['metadata_length'])
+                entry = dict(old_entry, offset=offset, length=len(data_slice))
+            else:
+                reprocessed.append(relpath)
+                try:
+                    with open(os.path.join(patterns_dir, relpath), 'rb') as product_file:
+                        data = json.loads(product_file.read())
+                except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                    print(f"Error reading {os.path.join(patterns_dir, relpath)}: {e}")
+                    continue
+                
+                match_data, metadata = split_metadata(data)
+                data_slice = marshal.dumps(match_data)
+                metadata_slice = zlib.compress(marshal.dumps(metadata), 6)
+                entry = manifest_entry(relpath, data, offset, len(data_slice))
+            
+            manifest.append(entry)
+            slices.append(data_slice)
+            metadata_slices.append(metadata_slice)
+            offset += len(data_slice)
+            pattern_count += entry['patterns']
+    finally:
+        if old is not None:
+            old[0].close()
+    
+    for entry, metadata_slice in zip(manifest, metadata_slices):
+        entry['metadata_offset'] = offset
+        entry['metadata_length'] = len(metadata_slice)
+        offset += len(metadata_slice)
+    
+    header = {
+        'schema_version': SCHEMA_VERSION,
+        'marshal_version': marshal.version,
+        'python_version': list(sys.version_info[:2]),
+        'content_hash': sources_digest(sources),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'products': len(manifest),
+        'patterns': pattern_count,
+        'sources': recorded_stats(sources),
+        'manifest': manifest,
+        'index': build_index(manifest)
+    }
+    
+    header_bytes = json.dumps(header).encode('utf-8')
+    
+    os.makedirs(os.path.dirname(os.path.abspath(bundle_path)), exist_ok=True)
+    temp_path = bundle_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER_LENGTH.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for data_slice in slices + metadata_slices:
+            f.write(data_slice)
+    os.replace(temp_path, bundle_path)
+    
+    record_build(state, 'bundle', bundle_path, sources)
+    save_state(state_path, state)
+    return header, reprocessed
+
+
+def iter_product_patterns(data):
+    """Yield every pattern of a product file, version-specific ones last"""
+    yield from data.get('all_versions', [])
+    for version_patterns in data.get('versions', {}).values():
+        yield from version_patterns
+
+
+def count_patterns(data):
+    """Count the patterns of a product file"""
+    return sum(1 for _ in iter_product_patterns(data))
+
+
+def split_metadata(data):
+    """Split product data into its match section and its metadata section
+    
+    The match section is a copy of data in which every pattern's metadata
+    is cut down to its tags. The metadata section lists each pattern's full
+    metadata in iter_product_patterns() order.
+    """
+    metadata = []
+    
+    def strip(pattern_data):
+        pattern_metadata = pattern_data.get('metadata', {})
+        metadata.append(pattern_metadata)
+        stripped = {key: value for key, value in pattern_data.items() if key != 'metadata'}
+        if pattern_metadata.get('tags'):
+            stripped['metadata'] = {'tags': pattern_metadata['tags']}
+        return stripped
+    
+    match_data = dict(data)
+    match_data['all_versions'] = [strip(pattern_data) for pattern_data in data.get('all_versions', [])]
+    match_data['versions'] = {
+        version_range: [strip(pattern_data) for pattern_data in version_patterns]
+        for version_range, version_patterns in data.get('versions', {}).items()
+    }
+    return match_data, metadata
+
+
+def merge_metadata(match_data, metadata):
+    """Put the metadata split off by split_metadata() back into match_data"""
+    for pattern_data, pattern_metadata in zip(iter_product_patterns(match_data), metadata):
+        pattern_data['metadata'] = pattern_metadata
+    return match_data
+
+
+def manifest_entry(relpath, data, offset, length):
+    """Describe where a product's slice is in the bundle body and what it contains"""
+    tags = set()
+    for pattern_data in iter_product_patterns(data):
+        tags.update(pattern_data.get('metadata', {}).get('tags', []))
+    
+    return {
+        'path': relpath,
+        'offset': offset,
+        'length': length,
+        'vendor_id': data.get('vendor_id', relpath.split('/')[1]),
+        'product_id': data.get('product_id', os.path.splitext(os.path.basename(relpath))[0]),
+        'category': data.get('category', 'Unknown'),
+        'tags': sorted(tags),
+        'patterns': count_patterns(data)
+    }
+
+
+def build_index(manifest):
+    """Map every vendor_id, product_id, category and tag to the positions of its manifest entries"""
+    index = {key: {} for key in INDEX_KEYS}
+    for position, entry in enumerate(manifest):
+        for key in INDEX_KEYS:
+            values = entry[key] if key == 'tags' else [entry[key]]
+            for value in values:
+                index[key].setdefault(value, []).append(position)
+    return index
+
+
+def select_entries(header, vendor_id=None, product=None, category=None, tags=None):
+    """Return the manifest entries matching all the given filters
+    
+    product is a product file name without .json, like the by-vendor paths
+    use; a product with any of tags matches.
+    """
+    index = header['index']
+    positions = None
+    
+    for key, values in (('vendor_id', [vendor_id] if vendor_id else None),
+                        ('category', [category] if category else None),
+                        ('tags', tags)):
+        if not values:
+            continue
+        matching = set()
+        for value in values:
+            matching.update(index[key].get(value, []))
+        positions = matching if positions is None else positions & matching
+    
+    if positions is None:
+        entries = header['manifest']
+    else:
+        entries = [header['manifest'][position] for position in sorted(positions)]
+    
+    if product:
+        entries = [entry for entry in entries if entry['path'].endswith(f"/{product}.json")]
+    return entries
+
+
+def read_header(f):
+    """Read a bundle header from an open file, or return None if it is not a usable bundle"""
+    if f.read(len(MAGIC)) != MAGIC:
+        return None
+    length_bytes = f.read(HEADER_LENGTH.size)
+    if len(length_bytes) != HEADER_LENGTH.size:
+        return None
+    
+    try:
+        header = json.loads(f.read(HEADER_LENGTH.unpack(length_bytes)[0]))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    
+    if (header.get('schema_version') != SCHEMA_VERSION
+            or header.get('marshal_version') != marshal.version
+            or header.get('python_version') != list(sys.version_info[:2])):
+        return None
+    return header
+
+
+def bundle_header(bundle_path):
+    """Return the header of a bundle, or None if it is missing or unusable"""
+    if not os.path.exists(bundle_path):
+        return None
+    with open(bundle_path, 'rb') as f:
+        return read_header(f)
+
+
+def is_fresh(header, patterns_dir):
+    """Return True if no product file was added, removed or modified since the bundle was built"""
+    product_files = find_product_files(patterns_dir)
+    if len(product_files) != len(header['sources']):
+        return False
+    
+    try:
+        return source_stats(patterns_dir, product_files) == header['sources']
+    except OSError:
+        return False
+
+
+def content_version(patterns_dir, state_path=None):
+    """Return a hash identifying the current contents of the product files
+    
+    This is the content_hash a bundle built now would have. Hashes recorded
+    in the build state are reused for files whose size and mtime did not
+    change, so this is cheap while the bundle is up to date.
+    """
+    state = load_state(state_path or default_state_path(patterns_dir))
+    record = state['artifacts'].get('bundle') or {}
+    return sources_digest(scan_sources(patterns_dir, find_product_files(patterns_dir), record.get('files')))
+
+
+def read_slice(f, body_start, offset, length, compressed=False):
+    """Read and decode one slice of a bundle body"""
+    f.seek(body_start + offset)
+    data = f.read(length)
+    return marshal.loads(zlib.decompress(data) if compressed else data)
+
+
+def load_bundle(patterns_dir, bundle_path=None, metadata=False, **filters):
+    """Return (header, [(relative path, data), ...]) from a fresh bundle, or None
+    
+    filters are passed to select_entries(), and only the slices of the
+    selected products are read and decoded. Patterns come with their tags
+    only, unless metadata is set.
+    """
+    bundle_path = bundle_path or default_bundle_path(patterns_dir)
+    if not os.path.exists(bundle_path):
+        return None
+    
+    products = []
+    with open(bundle_path, 'rb') as f:
+        header = read_header(f)
+        if header is None or not is_fresh(header, patterns_dir):
+            return None
+        body_start = f.tell()
+        
+        for entry in select_entries(header, **filters):
+            try:
+                data = read_slice(f, body_start, entry['offset'], entry['length'])
+                if metadata:
+                    merge_metadata(data, read_slice(f, body_start, entry['metadata_offset'],
+                                                    entry['metadata_length'], compressed=True))
+            except (zlib.error, ValueError, EOFError, TypeError):
+                return None
+            products.append((entry['path'], data))
+    
+    return header, products
+
+
+def bundled_products(patterns_dir, bundle_path=None, metadata=True):
+    """Return {path: product data} from a fresh bundle, or {} if there is none
+    
+    Paths are normalized the same way read_product() looks them up. Without
+    metadata, patterns come with their tags only.
+    """
+    bundle = load_bundle(patterns_dir, bundle_path, metadata=metadata)
+    if bundle is None:
+        return {}
+    header, products = bundle
+    return {os.path.normpath(os.path.join(patterns_dir, relpath)): data for relpath, data in products}
+
+
+def read_product(product_path, products=None):
+    """Return the data of a product file
+    
+    The data is taken from products, as returned by bundled_products(), when
+    the file is in there, and read from disk otherwise, raising the same
+    errors json.load() would.
+    """
+    if products:
+        data = products.get(os.path.normpath(product_path))
+        if data is not None:
+            return data
+    with open(product_path, 'r') as f:
+        return json.load(f)
+
+
+# (mtime, header, body start, manifest entries by path) by bundle path
+header_cache = {}
+
+# Metadata lists by (product path, size, mtime_ns) of the product file
+metadata_cache = {}
+METADATA_CACHE_SIZE = 256
+
+
+def cached_header(bundle_path):
+    """Return (header, body start, {relative path: manifest entry}) for a bundle
+    
+    The header is only read again when the bundle file changes.
+    """
+    try:
+        mtime = os.stat(bundle_path).st_mtime_ns
+    except OSError:
+        return None
+    
+    cached = header_cache.get(bundle_path)
+    if cached is None or cached[0] != mtime:
+        with open(bundle_path, 'rb') as f:
+            header = read_header(f)
+            body_start = f.tell()
+        entries = {entry['path']: entry for entry in header['manifest']} if header else {}
+        cached = header_cache[bundle_path] = (mtime, header, body_start, entries)
+    
+    if cached[1] is None:
+        return None
+    return cached[1:]
+
+
+def bundled_metadata(patterns_dir, relpath, source, bundle_path=None):
+    """Return a product's metadata section from the bundle, or None if its slice is missing or stale"""
+    bundle_path = bundle_path or default_bundle_path(patterns_dir)
+    cached = cached_header(bundle_path)
+    if cached is None:
+        return None
+    
+    header, body_start, entries = cached
+    entry = entries.get(relpath)
+    if entry is None or header['sources'].get(relpath) != source:
+        return None
+    
+    with open(bundle_path, 'rb') as f:
+        try:
+            return read_slice(f, body_start, entry['metadata_offset'], entry['metadata_length'], compressed=True)
+        except (zlib.error, ValueError, EOFError, TypeError):
+            return None
+
+
+def product_metadata(patterns_dir, relpath, bundle_path=None):
+    """Return the metadata of every pattern of a product file, in iter_product_patterns() order
+    
+    The metadata section is read from the bundle when the product's slice
+    is up to date with the file, and from the file otherwise. Returns [] if
+    the file was removed or cannot be read or parsed.
+    """
+    product_path = os.path.join(patterns_dir, relpath)
+    try:
+        stat = os.stat(product_path)
+    except OSError:
+        return []
+    key = (product_path, stat.st_size, stat.st_mtime_ns)
+    
+    metadata = metadata_cache.get(key)
+    if metadata is None:
+        metadata = bundled_metadata(patterns_dir, relpath, [stat.st_size, stat.st_mtime_ns], bundle_path)
+        if metadata is None:
+            try:
+                with open(product_path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return []
+            metadata = [pattern_data.get('metadata', {}) for pattern_data in iter_product_patterns(data)]
+        
+        if len(metadata_cache) >= METADATA_CACHE_SIZE:
+            metadata_cache.clear()
+        metadata_cache[key] = metadata
+    
+    return metadata
+
+
+def pattern_metadata(patterns_dir, pattern_id, bundle_path=None):
+    """Return the metadata of the pattern identified by "<relative path>#<position>"
+    
+    Returns {} if the pattern or its product file no longer exists, or the
+    file cannot be read.
+    """
+    relpath, _, position = pattern_id.rpartition('#')
+    metadata = product_metadata(patterns_dir, relpath, bundle_path)
+    position = int(position)
+    return metadata[position] if position < len(metadata) else {}
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+SQLite catalog of the pattern database shared by the tools
+
+The catalog holds the contents of patterns/by-vendor in indexed tables, so
+tools can answer questions such as "all patterns with a version group in
+category cms and priority above 100" with a query instead of reading every
+product file:
+    
+    vendors     vendor_id, name
+    products    id, path, vendor_id, vendor, product_id, name, category
+    patterns    id, product, position, version_range, name, pattern,
+                version_group, priority, confidence, scope (JSON), author,
+                description, created_at, updated_at
+    pattern_tags    pattern, tag
+    test_cases  id, pattern, input, expected_version
+
+position is the pattern's place in its product file, so a pattern's ID in
+the other tools is "<products.path>#<patterns.position>". version_range is
+NULL for patterns that apply to all versions. products.vendor is the
+vendor name as written in the product file, vendors.name the first one seen
+for that vendor_id. Like the pattern bundle, the
+catalog records the size and mtime of every source file in a sources table
+and is only used while those still match the files on disk. Rebuilds go
+through the build state file (see build_state.py) and only replace the rows
+of product files whose content changed.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+from build_state import (default_state_path, diff_sources, load_state, previous_build, record_build,
+                         recorded_stats, save_state, scan_sources, sources_digest)
+from pattern_bundle import find_product_files, iter_product_patterns, source_stats
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE sources (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER);
+CREATE TABLE vendors (vendor_id TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    vendor_id TEXT REFERENCES vendors (vendor_id),
+    vendor TEXT,
+    product_id TEXT,
+    name TEXT,
+    category TEXT
+);
+CREATE TABLE patterns (
+    id INTEGER PRIMARY KEY,
+    product INTEGER REFERENCES products (id),
+    position INTEGER,
+    version_range TEXT,
+    name TEXT,
+    pattern TEXT,
+    version_group INTEGER,
+    priority INTEGER,
+    confidence REAL,
+    scope TEXT,
+    author TEXT,
+    description TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE pattern_tags (pattern INTEGER REFERENCES patterns (id), tag TEXT);
+CREATE TABLE test_cases (
+    id INTEGER PRIMARY KEY,
+    pattern INTEGER REFERENCES patterns (id),
+    input TEXT,
+    expected_version TEXT
+);
+CREATE INDEX products_vendor_id ON products (vendor_id);
+CREATE INDEX products_product_id ON products (product_id);
+CREATE INDEX products_category ON products (category);
+CREATE INDEX patterns_product ON patterns (product, position);
+CREATE INDEX patterns_priority ON patterns (priority);
+CREATE INDEX pattern_tags_tag ON pattern_tags (tag, pattern);
+CREATE INDEX pattern_tags_pattern ON pattern_tags (pattern);
+CREATE INDEX test_cases_pattern ON test_cases (pattern);
+"""
+
+# Columns the pattern loader reads, in the order select_patterns() returns them
+PATTERN_COLUMNS = (
+    'products.path', 'products.vendor', 'products.name', 'products.category',
+    'patterns.position', 'patterns.version_range', 'patterns.name', 'patterns.pattern',
+    'patterns.version_group', 'patterns.priority', 'patterns.confidence', 'patterns.scope'
+)
+
+
+def default_catalog_path(patterns_dir):
+    """Return where the catalog for a patterns directory is built by default"""
+    return os.path.join(os.path.dirname(os.path.abspath(patterns_dir)), 'build', 'patterns.db')
+
+
+def insert_product(conn, relpath, data):
+    """Insert a product file's vendor, product, patterns, tags and test cases"""
+    vendor_id = data.get('vendor_id', relpath.split('/')[1])
+    conn.execute("INSERT OR IGNORE INTO vendors (vendor_id, name) VALUES (?, ?)",
+                 (vendor_id, data.get('vendor', 'Unknown')))
+    product = conn.execute(
+        "INSERT INTO products (path, vendor_id, vendor, product_id, name, category) VALUES (?, ?, ?, ?, ?, ?)",
+        (relpath, vendor_id, data.get('vendor', 'Unknown'), data.get('product_id'), data.get('product', 'Unknown'),
+         data.get('category', 'Unknown'))
+    ).lastrowid
+    
+    version_ranges = [None] * len(data.get('all_versions', []))
+    for version_range, version_patterns in data.get('versions', {}).items():
+        version_ranges.extend([version_range] * len(version_patterns))
+    
+    for position, (pattern_data, version_range) in enumerate(zip(iter_product_patterns(data), version_ranges)):
+        metadata = pattern_data.get('metadata', {})
+        scope = pattern_data.get('scope')
+        pattern = conn.execute(
+            "INSERT INTO patterns (product, position, version_range, name, pattern, version_group, priority, "
+            "confidence, scope, author, description, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (product, position, version_range, pattern_data.get('name', 'Unknown'), pattern_data.get('pattern', ''),
+             pattern_data.get('version_group', 0), pattern_data.get('priority', 0),
+             pattern_data.get('confidence', 0.0), json.dumps(scope) if scope is not None else None,
+             metadata.get('author'), metadata.get('description'), metadata.get('created_at'),
+             metadata.get('updated_at'))
+        ).lastrowid
+        conn.executemany("INSERT INTO pattern_tags (pattern, tag) VALUES (?, ?)",
+                         [(pattern, tag) for tag in metadata.get('tags', [])])
+        conn.executemany("INSERT INTO test_cases (pattern, input, expected_version) VALUES (?, ?, ?)",
+                         [(pattern, test_case.get('input'), test_case.get('expected_version'))
+                          for test_case in metadata.get('test_cases', [])])
+
+
+def delete_product(conn, relpath):
+    """Delete a product and its patterns, tags and test cases from the catalog"""
+    row = conn.execute("SELECT id FROM products WHERE path = ?", (relpath,)).fetchone()
+    if row is None:
+        return
+    conn.execute("DELETE FROM test_cases WHERE pattern IN (SELECT id FROM patterns WHERE product = ?)", row)
+    conn.execute("DELETE FROM pattern_tags WHERE pattern IN (SELECT id FROM patterns WHERE product = ?)", row)
+    conn.execute("DELETE FROM patterns WHERE product = ?", row)
+    conn.execute("DELETE FROM products WHERE id = ?", row)
+
+
+def previous_catalog(catalog_path, previous):
+    """Open the catalog a build state describes for updating, or return None
+    
+    Returns None if there is no such record, or if the catalog on disk is
+    missing, unusable or not the one the record was made for.
+    """
+    if previous is None or not os.path.exists(catalog_path):
+        return None
+    
+    conn = sqlite3.connect(catalog_path)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+    except sqlite3.DatabaseError:
+        meta = {}
+    if meta.get('schema_version') != str(SCHEMA_VERSION) or meta.get('content_hash') != previous.get('content_hash'):
+        conn.close()
+        return None
+    return conn
+
+
+def build_catalog(patterns_dir, catalog_path=None, state_path=None, full=False):
+    """Build or update the catalog and return (products, patterns, reprocessed paths)
+    
+    Unless full is set, an existing catalog is updated in place: only the
+    product files whose content changed since it was last built, according
+    to the build state file, are deleted and inserted again. Files that are
+    not valid JSON are reported and left out, but still recorded as sources
+    so the catalog is not considered stale because of them.
+    """
+    catalog_path = catalog_path or default_catalog_path(patterns_dir)
+    state_path = state_path or default_state_path(patterns_dir)
+    state = load_state(state_path)
+    previous = None if full else previous_build(state, 'catalog', catalog_path)
+    sources = scan_sources(patterns_dir, find_product_files(patterns_dir), previous['files'] if previous else None)
+    
+    temp_path = None
+    conn = previous_catalog(catalog_path, previous)
+    if conn is not None:
+        changed, removed = diff_sources(previous['files'], sources)
+        # Files left out of the last build, such as invalid ones, are retried
+        present = {path for path, in conn.execute("SELECT path FROM products")}
+        changed = sorted(set(changed).union(relpath for relpath in sources if relpath not in present))
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(catalog_path)), exist_ok=True)
+        temp_path = catalog_path + '.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        conn = sqlite3.connect(temp_path)
+        conn.executescript(SCHEMA)
+        changed, removed = list(sources), []
+    
+    try:
+        for relpath in removed + changed:
+            delete_product(conn, relpath)
+        
+        for relpath in changed:
+            product_path = os.path.join(patterns_dir, relpath)
+            try:
+                with open(product_path, 'r') as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                print(f"Error reading {product_path}: {e}")
+                continue
+            insert_product(conn, relpath, data)
+        
+        conn.execute("DELETE FROM vendors WHERE vendor_id NOT IN (SELECT vendor_id FROM products)")
+        conn.execute("DELETE FROM sources")
+        conn.executemany("INSERT INTO sources (path, size, mtime_ns) VALUES (?, ?, ?)",
+                         [(relpath, size, mtime) for relpath, (size, mtime) in recorded_stats(sources).items()])
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ('schema_version', str(SCHEMA_VERSION)),
+            ('content_hash', sources_digest(sources)),
+            ('created_at', datetime.now(timezone.utc).isoformat())
+        ])
+        conn.commit()
+        counts = conn.execute("SELECT (SELECT COUNT(*) FROM products), (SELECT COUNT(*) FROM patterns)").fetchone()
+    finally:
+        conn.close()
+    
+    if temp_path:
+        os.replace(temp_path, catalog_path)
+    record_build(state, 'catalog', catalog_path, sources)
+    save_state(state_path, state)
+    return counts + (changed,)
+
+
+def is_fresh(conn, patterns_dir):
+    """Return True if the catalog matches the product files on disk"""
+    try:
+        schema_version = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if schema_version is None or schema_version[0] != str(SCHEMA_VERSION):
+            return False
+        recorded = {path: [size, mtime] for path, size, mtime in conn.execute("SELECT path, size, mtime_ns FROM sources")}
+    except sqlite3.DatabaseError:
+        return False
+    
+    product_files = find_product_files(patterns_dir)
+    if len(product_files) != len(recorded):
+        return False
+    try:
+        return source_stats(patterns_dir, product_files) == recorded
+    except OSError:
+        return False
+
+
+def open_catalog(patterns_dir, catalog_path=None):
+    """Open a fresh catalog read-only, or return None if it is missing or stale"""
+    catalog_path = catalog_path or default_catalog_path(patterns_dir)
+    if not os.path.exists(catalog_path):
+        return None
+    
+    try:
+        conn = sqlite3.connect(f"file:{catalog_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+    if not is_fresh(conn, patterns_dir):
+        conn.close()
+        return None
+    return conn
+
+
+def select_patterns(conn, vendor_id=None, product=None, category=None, tags=None, where=None):
+    """Return pattern rows (see PATTERN_COLUMNS) matching all the given filters
+    
+    product is a product file name without .json; a pattern with any of
+    tags matches. where is an extra SQL condition over the products,
+    vendors and patterns tables, such as "patterns.priority > 100". Rows are
+    ordered by product path and position.
+    """
+    conditions = []
+    params = []
+    
+    if vendor_id:
+        conditions.append("products.vendor_id = ?")
+        params.append(vendor_id)
+    if product:
+        conditions.append("products.path LIKE ?")
+        params.append(f"by-vendor/%/{product}.json")
+    if category:
+        conditions.append("products.category = ?")
+        params.append(category)
+    if tags:
+        conditions.append("patterns.id IN (SELECT pattern FROM pattern_tags WHERE tag IN (%s))"
+                          % ', '.join('?' * len(tags)))
+        params.extend(tags)
+    if where:
+        conditions.append(f"({where})")
+    
+    query = (f"SELECT {', '.join(PATTERN_COLUMNS)} FROM patterns "
+             "JOIN products ON patterns.product = products.id "
+             "JOIN vendors ON products.vendor_id = vendors.vendor_id")
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY products.path, patterns.position"
+    return conn.execute(query, params).fetchall()
+
+
+def product_counts(conn):
+    """Return {relative path: (vendor, product, category, generic, version-specific)} pattern counts"""
+    rows = conn.execute(
+        "SELECT products.path, products.vendor, products.name, products.category, "
+        "COUNT(patterns.id) - COUNT(patterns.version_range), COUNT(patterns.version_range) "
+        "FROM products LEFT JOIN patterns ON patterns.product = products.id "
+        "GROUP BY products.id"
+    )
+    return {row[0]: row[1:] for row in rows}
+
+
+def catalog_product_counts(patterns_dir, catalog_path=None):
+    """Return product_counts() from a fresh catalog, or {} if there is none"""
+    conn = open_catalog(patterns_dir, catalog_path)
+    if conn is None:
+        return {}
+    try:
+        return product_counts(conn)
+    finally:
+        conn.close()
+
+
+def catalog_statistics(patterns_dir, catalog_path=None):
+    """Return pattern_statistics() from a fresh catalog, or None if there is none"""
+    conn = open_catalog(patterns_dir, catalog_path)
+    if conn is None:
+        return None
+    try:
+        return pattern_statistics(conn)
+    finally:
+        conn.close()
+
+
+def pattern_statistics(conn):
+    """Return pattern totals and counts by category, vendor and product name"""
+    def grouped(column):
+        return dict(conn.execute(
+            f"SELECT products.{column}, COUNT(*) FROM patterns "
+            "JOIN products ON patterns.product = products.id "
+            f"GROUP BY products.{column}"
+        ))
+    
+    total_patterns, = conn.execute("SELECT COUNT(*) FROM patterns").fetchone()
+    total_test_cases, patterns_with_test_cases = conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT pattern) FROM test_cases"
+    ).fetchone()
+    
+    return {
+        'total_patterns': total_patterns,
+        'patterns_by_category': grouped('category'),
+        'patterns_by_vendor': grouped('vendor'),
+        'patterns_by_product': grouped('name'),
+        'total_test_cases': total_test_cases,
+        'patterns_with_test_cases': patterns_with_test_cases
+    }
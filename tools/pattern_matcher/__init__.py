@@ -0,0 +1,77 @@
+"""
+Importable pattern matching library
+
+Loads patterns from patterns/by-vendor (or the pattern bundle or catalog),
+compiles them into a reusable PatternSet and matches texts and responses:
+    
+    import pattern_matcher
+    
+    pattern_set = pattern_matcher.PatternSet.load(patterns_dir, category='web')
+    results = pattern_set.match('Server: Apache/2.4.41 (Ubuntu)')
+    
+    # Or load and compile the whole database on first use
+    results = pattern_matcher.match('Server: nginx/1.18.0')
+
+The tools directory must be on sys.path, since the package uses the
+pattern_bundle, pattern_catalog and build_state modules next to it.
+
+Importing the package loads none of its modules: each name below is
+imported from its module on first access, and patterns are only loaded
+and compiled when asked for. benchmark-import-time.py guards this.
+"""
+
+import importlib
+
+# Public names and the module each one is imported from on first access
+EXPORTS = {
+    'load_patterns': 'loader',
+    'extract_patterns': 'loader',
+    'preload_products': 'loader',
+    'pattern_key': 'loader',
+    'PatternRecord': 'loader',
+    'ProductInfo': 'loader',
+    'LiteralAutomaton': 'analysis',
+    'analyze_pattern': 'analysis',
+    'check_redos': 'redos',
+    'find_suspects': 'redos',
+    'WARNING_KINDS': 'redos',
+    'DEFAULT_REDOS_THRESHOLD': 'redos',
+    'DEFAULT_REDOS_LENGTH': 'redos',
+    'PatternSet': 'pattern_set',
+    'DEFAULT_PATTERNS_DIR': 'pattern_set',
+    'DEFAULT_CHUNK_SIZE': 'pattern_set',
+    'DEFAULT_WINDOW_SIZE': 'pattern_set',
+    'default_pattern_set': 'pattern_set',
+    'match': 'pattern_set',
+    'match_patterns': 'pattern_set',
+    'report_failed': 'pattern_set',
+    'split_response': 'pattern_set',
+    'check_record': 'pattern_set',
+    'GuardedMatcher': 'guard',
+    'DEFAULT_TIME_BUDGET': 'guard',
+    'DEFAULT_MAX_STRIKES': 'guard',
+    'load_quarantine': 'guard',
+    'save_quarantine': 'guard',
+    'parallel_match_batch': 'parallel',
+    'AsyncMatcher': 'aio',
+    'PatternReloader': 'reload',
+    'DEFAULT_RELOAD_INTERVAL': 'reload',
+    'MatchService': 'server',
+    'DEFAULT_SERVE_ADDRESS': 'server',
+    'serve': 'server',
+}
+
+__all__ = sorted(EXPORTS)
+
+
+def __getattr__(name):
+    module = EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(EXPORTS))
@@ -0,0 +1,145 @@
+"""
+asyncio API for matching without blocking the event loop
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import sys
+from collections import deque
+
+from .defaults import DEFAULT_ASYNC_CHUNK_SIZE
+from .parallel import init_worker, match_chunk_in_worker
+from .pattern_set import PatternSet, iter_inputs
+
+
+async def aiter_inputs(texts):
+    """Yield (input_id, item) pairs from a sync or async iterable like iter_inputs()"""
+    if not hasattr(texts, '__aiter__'):
+        for pair in iter_inputs(texts):
+            yield pair
+        return
+    
+    position = 0
+    async for item in texts:
+        position += 1
+        if isinstance(item, (str, dict)):
+            yield position, item
+        else:
+            input_id, text = item
+            yield input_id, text
+
+
+async def aiter_chunks(items, chunk_size):
+    """Yield lists of up to chunk_size items from an async iterable"""
+    chunk = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class AsyncMatcher:
+    """Match texts from asyncio code on a bounded executor
+    
+    The CPU work runs on an executor of workers threads sharing one compiled
+    PatternSet, or with processes() on worker processes that each load their
+    own, which keeps the regex searches from competing with the event loop
+    for the GIL. At most max_pending jobs are queued or running at once:
+    match() waits for a free slot, and match_batch() reads no further ahead
+    of its consumer than max_pending chunks of chunk_size inputs.
+    
+    Cancelling a match() or closing a match_batch() cancels the jobs that
+    have not started yet; a job already running finishes in the background
+    and its result is dropped, so chunk_size bounds how long that takes.
+    """
+    
+    def __init__(self, pattern_set=None, workers=1, max_pending=None, chunk_size=DEFAULT_ASYNC_CHUNK_SIZE,
+                 executor=None):
+        if executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='pattern-matcher')
+            self.match_chunk = pattern_set.match_chunk
+        else:
+            # A process pool whose workers hold their own pattern set, see processes()
+            self.executor = executor
+            self.match_chunk = match_chunk_in_worker
+        self.max_pending = max_pending or workers * 2
+        self.chunk_size = chunk_size
+        # Created on first use, inside the event loop that runs the matches
+        self.slots = None
+        self.jobs = set()
+    
+    @classmethod
+    async def load(cls, patterns_dir, vendor=None, product=None, workers=1, max_pending=None,
+                   chunk_size=DEFAULT_ASYNC_CHUNK_SIZE, **options):
+        """Load and compile patterns off the event loop and return a thread-based matcher"""
+        loop = asyncio.get_running_loop()
+        pattern_set = await loop.run_in_executor(
+            None, functools.partial(PatternSet.load, patterns_dir, vendor, product, **options))
+        return cls(pattern_set, workers, max_pending, chunk_size)
+    
+    @classmethod
+    def processes(cls, workers, patterns_dir, vendor=None, product=None, max_pending=None,
+                  chunk_size=DEFAULT_ASYNC_CHUNK_SIZE, **options):
+        """Return a matcher running on worker processes, each loading the patterns once"""
+        executor = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=init_worker, initargs=(patterns_dir, vendor, product, options))
+        return cls(None, workers, max_pending, chunk_size, executor)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        """Shut the executor down, cancelling the jobs that have not started
+        
+        On Python 3.8 a process pool left to shut down in the background can
+        hang the interpreter at exit, so there close() waits for the jobs
+        already running on worker processes.
+        """
+        # Cancelled here rather than with shutdown(cancel_futures=True), which needs Python 3.9
+        for job in list(self.jobs):
+            job.cancel()
+        wait = sys.version_info < (3, 9) and isinstance(self.executor, concurrent.futures.ProcessPoolExecutor)
+        self.executor.shutdown(wait=wait)
+    
+    async def run(self, chunk):
+        """Match a list of (input_id, item) pairs on the executor once a slot is free"""
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_pending)
+        async with self.slots:
+            job = self.executor.submit(self.match_chunk, chunk)
+            self.jobs.add(job)
+            job.add_done_callback(self.jobs.discard)
+            return await asyncio.wrap_future(job)
+    
+    async def match(self, item):
+        """Match a text or response record and return its results"""
+        records = await self.run([(1, item)])
+        return records[0]['results']
+    
+    async def match_batch(self, texts, chunk_size=None):
+        """Match many texts and yield {'id', 'results'} records in input order
+        
+        texts may be a sync or async iterable of strings, records or
+        (input_id, item) pairs. Chunks are matched concurrently, up to
+        max_pending at a time.
+        """
+        pending = deque()
+        try:
+            async for chunk in aiter_chunks(aiter_inputs(texts), chunk_size or self.chunk_size):
+                pending.append(asyncio.ensure_future(self.run(chunk)))
+                if len(pending) >= self.max_pending:
+                    for record in await pending.popleft():
+                        yield record
+            while pending:
+                for record in await pending.popleft():
+                    yield record
+        finally:
+            for task in pending:
+                task.cancel()
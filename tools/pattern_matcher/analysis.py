@@ -0,0 +1,234 @@
+"""
+Static analysis of regex patterns for PatternSet
+
+Patterns are parsed once to find the fixed strings they match and the
+literal every match must contain. LiteralAutomaton finds the patterns whose
+literal occurs in a text with a single scan.
+"""
+
+import re
+from collections import deque
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+# Scope searches: all, body, headers or headers[<name>]
+SCOPE_SEARCH = re.compile(r'(all|body|headers)(?:\[\s*([^\]\s](?:[^\]]*[^\]\s])?)\s*\])?')
+
+
+# Repeat opcodes whose body must occur at least `min` times
+REPEAT_OPCODES = tuple(
+    getattr(sre_constants, name) for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_constants, name)
+)
+
+
+def collect_literals(subpattern, literals):
+    """Collect literal runs that every match of a parsed subpattern contains"""
+    run = []
+    
+    for op, av in subpattern:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        
+        # Anything else ends the current run of literal characters
+        if run:
+            literals.append(''.join(run))
+            run = []
+        
+        if op is sre_constants.SUBPATTERN:
+            group, add_flags, del_flags, body = av
+            if not add_flags & sre_constants.SRE_FLAG_IGNORECASE:
+                collect_literals(body, literals)
+        elif op in REPEAT_OPCODES:
+            minimum, maximum, body = av
+            if minimum >= 1:
+                collect_literals(body, literals)
+        elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+            collect_literals(av, literals)
+    
+    if run:
+        literals.append(''.join(run))
+
+
+def parse_pattern(pattern):
+    """Parse a regex pattern into its syntax tree, or return None if it is invalid"""
+    try:
+        return sre_parse.parse(pattern)
+    except (re.error, RecursionError, OverflowError):
+        return None
+
+
+def pure_literal(parsed):
+    """Return the fixed string a parsed pattern matches, or None if it is a real regex"""
+    if parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return None
+    if not all(op is sre_constants.LITERAL for op, av in parsed):
+        return None
+    return ''.join(chr(av) for op, av in parsed)
+
+
+def iter_subpatterns(av):
+    """Yield the nested subpatterns contained in an opcode argument"""
+    if isinstance(av, sre_parse.SubPattern):
+        yield av
+    elif isinstance(av, (tuple, list)):
+        for item in av:
+            yield from iter_subpatterns(item)
+
+
+def contains_opcode(subpattern, opcodes):
+    """Return True if any of opcodes occurs anywhere in a parsed subpattern"""
+    for op, av in subpattern:
+        if op in opcodes:
+            return True
+        for nested in iter_subpatterns(av):
+            if contains_opcode(nested, opcodes):
+                return True
+    return False
+
+
+def required_literal(parsed):
+    """Return the longest literal that every match of a parsed pattern contains, or None"""
+    # Case-insensitive patterns can match text that does not contain the literal
+    if parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return None
+    
+    literals = []
+    collect_literals(parsed, literals)
+    if not literals:
+        return None
+    return max(literals, key=len)
+
+
+def analyze_pattern(pattern, prefilter=True):
+    """Parse and compile one pattern for PatternSet
+    
+    Returns (literal, regex, prefilter literal, error). literal is
+    set for patterns taking the literal path and regex for the others; error
+    is the re.error of a pattern that does not compile.
+    """
+    parsed = parse_pattern(pattern)
+    literal = pure_literal(parsed) if parsed is not None else None
+    
+    regex = None
+    if not literal:
+        literal = None
+        try:
+            regex = re.compile(pattern)
+        except re.error as e:
+            return None, None, None, e
+    
+    prefilter_literal = None
+    if prefilter and parsed is not None:
+        prefilter_literal = literal or required_literal(parsed)
+    return literal, regex, prefilter_literal, None
+
+
+def normalize_scope(scope):
+    """Return (search, header, status) for a pattern's scope, or None if it covers the whole response
+    
+    search is None for the whole response, "body" or "headers". header is
+    the lower-case name of the one header a "headers[<name>]" scope
+    searches, and None otherwise. status is None or the HTTP status the
+    response must have. Raises ValueError for a scope that does not parse.
+    """
+    if not scope:
+        return None
+    
+    search = scope.get('search') or 'all'
+    match = SCOPE_SEARCH.fullmatch(search.strip().lower()) if isinstance(search, str) else None
+    if match is None or (match.group(2) is not None and match.group(1) != 'headers'):
+        raise ValueError(f"invalid scope search {search!r}")
+    search, header = match.groups()
+    if search == 'all':
+        search = None
+    
+    status = scope.get('status')
+    if status is not None:
+        try:
+            status = int(status)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid scope status {status!r}") from None
+    
+    if search is None and status is None:
+        return None
+    return search, header, status
+
+
+class LiteralAutomaton:
+    """Aho-Corasick automaton reporting which keys' literals occur in a text
+    
+    With max_length set, only that many leading characters of each literal
+    are added, which bounds the number of states. A reported key then only
+    means the prefix occurred, see exact().
+    """
+    
+    def __init__(self, max_length=None):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.max_length = max_length
+    
+    def exact(self, literal):
+        """Return True if a report for literal means the whole literal occurred"""
+        return self.max_length is None or len(literal) <= self.max_length
+    
+    def add(self, literal, key):
+        """Register literal so that scan() reports key when it occurs"""
+        if self.max_length is not None:
+            literal = literal[:self.max_length]
+        state = 0
+        for char in literal:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(key)
+    
+    def build(self):
+        """Compute failure links; call once after all literals are added"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+    
+    def scan(self, text):
+        """Return the set of keys whose literal occurs in text"""
+        found = set()
+        self.feed(text, 0, found)
+        return found
+    
+    def feed(self, chunk, state, found):
+        """Scan one piece of a longer input, adding keys to found
+        
+        Returns the automaton state to pass with the next piece, so literals
+        spanning piece boundaries are still reported.
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        
+        for char in chunk:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        
+        return state
@@ -0,0 +1,45 @@
+"""
+Default settings of the pattern matcher
+
+Kept apart from the modules using them so that reading a default, for
+example for a command-line help text, imports nothing else.
+"""
+
+import os
+
+# Patterns directory of the repository this package belongs to
+DEFAULT_PATTERNS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                    'patterns')
+
+# Number of inputs handed to a PatternSet at a time in batch mode
+DEFAULT_CHUNK_SIZE = 256
+
+# Seconds a single regex search may run under GuardedMatcher
+DEFAULT_TIME_BUDGET = 1.0
+
+# Budget overruns after which GuardedMatcher quarantines a pattern
+DEFAULT_MAX_STRIKES = 2
+
+# Inputs per executor job of AsyncMatcher.match_batch(), small so that cancelling takes effect quickly
+DEFAULT_ASYNC_CHUNK_SIZE = 32
+
+# Bytes of a large input scanned per window by ByteScanner
+DEFAULT_WINDOW_SIZE = 1 << 20
+
+# Address the matching daemon listens on unless --serve names another
+DEFAULT_SERVE_ADDRESS = '127.0.0.1:8765'
+
+# Seconds between PatternReloader's checks for changed product files
+DEFAULT_RELOAD_INTERVAL = 2.0
+
+# Most recent request latencies MatchService computes its percentiles over
+LATENCY_WINDOW = 10000
+
+# Characters of each required literal PatternSet loads into its automaton
+PREFILTER_LITERAL_LENGTH = 16
+
+# Seconds of search time at which the ReDoS check stops growing an adversarial input
+DEFAULT_REDOS_THRESHOLD = 0.1
+
+# Characters of the longest adversarial input the ReDoS check times
+DEFAULT_REDOS_LENGTH = 10000
@@ -0,0 +1,197 @@
+"""
+Matching under a per-search time budget with pattern quarantine
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+
+from .defaults import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_STRIKES, DEFAULT_TIME_BUDGET
+from .loader import pattern_key
+from .pattern_set import check_record, iter_chunks, iter_inputs
+
+
+def guarded_worker(pattern_set, conn, progress):
+    """Serve match requests from a GuardedMatcher, reporting each search start"""
+    def report(index):
+        progress[1] = time.monotonic()
+        progress[0] = index
+    
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        
+        item, skip = request
+        results = pattern_set.match_input(item, skip=skip, progress=report)
+        progress[0] = -1
+        conn.send(results)
+
+
+class GuardedMatcher:
+    """Match texts in a killable worker process with a per-search time budget
+    
+    The worker reports which pattern it is searching and since when. A
+    search that runs longer than budget seconds gets the worker killed and
+    restarted, and the text is matched again without the offending pattern.
+    A pattern that overruns the budget max_strikes times is quarantined and
+    skipped for all later texts. A worker that dies on its own is replaced
+    as well.
+    """
+    
+    def __init__(self, pattern_set, budget=DEFAULT_TIME_BUDGET, max_strikes=DEFAULT_MAX_STRIKES,
+                 quarantined=()):
+        self.pattern_set = pattern_set
+        self.budget = budget
+        self.max_strikes = max_strikes
+        self.strikes = Counter()
+        self.timeouts = 0
+        self.process = None
+        self.conn = None
+        self.progress = multiprocessing.RawArray('d', 2)
+        
+        quarantined = set(quarantined)
+        self.quarantined = {index for index, pattern_data in enumerate(pattern_set.patterns)
+                            if pattern_key(pattern_data) in quarantined}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def start(self):
+        """Start a fresh worker process"""
+        self.progress[0] = -1
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=guarded_worker,
+                                               args=(self.pattern_set, child_conn, self.progress),
+                                               daemon=True)
+        self.process.start()
+        child_conn.close()
+    
+    def close(self):
+        """Stop the worker process"""
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.process = None
+    
+    def kill(self):
+        """Kill a stalled worker process"""
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+    
+    def match(self, text):
+        """Match text or a response record like PatternSet.match_input,
+        abandoning searches that exceed the budget
+        
+        Records are checked with check_record() before they reach the
+        worker. Raises RuntimeError if the worker dies while matching; the
+        next call starts a new one.
+        """
+        if isinstance(text, dict):
+            check_record(text)
+        skip = set(self.quarantined)
+        poll_interval = min(self.budget / 4, 0.05)
+        restarted = False
+        
+        while True:
+            if self.process is None:
+                self.start()
+            try:
+                self.conn.send((text, skip))
+            except BrokenPipeError:
+                # The worker died after its last text: replace it once and send again
+                self.kill()
+                if restarted:
+                    raise RuntimeError("the guarded worker exited before matching") from None
+                restarted = True
+                continue
+            
+            while not self.conn.poll(poll_interval):
+                index = int(self.progress[0])
+                if index >= 0 and time.monotonic() - self.progress[1] > self.budget:
+                    break
+            else:
+                try:
+                    return self.conn.recv()
+                except EOFError:
+                    self.kill()
+                    raise RuntimeError("the guarded worker exited while matching") from None
+            
+            # The search of pattern `index` blew the budget: drop it for this text
+            self.kill()
+            self.timeouts += 1
+            self.strikes[index] += 1
+            if self.strikes[index] >= self.max_strikes:
+                self.quarantined.add(index)
+            skip.add(index)
+    
+    def match_batch(self, texts, chunk_size=None):
+        """Match many texts like PatternSet.match_batch"""
+        for chunk in iter_chunks(iter_inputs(texts), chunk_size or DEFAULT_CHUNK_SIZE):
+            for input_id, item in chunk:
+                yield {'id': input_id, 'results': self.match(item)}
+    
+    def quarantine_report(self):
+        """Return the quarantined patterns with their number of budget overruns"""
+        report = []
+        for index in sorted(self.quarantined):
+            pattern_data = self.pattern_set.patterns[index]
+            report.append({
+                'vendor': pattern_data['vendor'],
+                'product': pattern_data['product'],
+                'name': pattern_data['name'],
+                'pattern': pattern_data['pattern'],
+                'strikes': self.strikes[index]
+            })
+        return report
+
+
+def load_quarantine(path):
+    """Load the pattern keys recorded in a quarantine file, if it exists"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {pattern_key(entry) for entry in data.get('quarantined', [])}
+
+
+def save_quarantine(path, report):
+    """Merge a quarantine report into a quarantine file so later runs skip the same patterns
+    
+    Entries already in the file are kept, also those of patterns that were
+    not loaded in this run. An entry reported again has its strikes added to
+    the recorded ones.
+    """
+    entries = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for entry in data.get('quarantined', []):
+            entries[pattern_key(entry)] = entry
+    
+    for entry in report:
+        key = pattern_key(entry)
+        if key in entries:
+            entry = dict(entry, strikes=entries[key].get('strikes', 0) + entry['strikes'])
+        entries[key] = entry
+    
+    with open(path, 'w') as f:
+        json.dump({'quarantined': list(entries.values())}, f, indent=2)
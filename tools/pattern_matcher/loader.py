@@ -0,0 +1,280 @@
+"""
+Loading patterns from the by-vendor structure, the bundle or the catalog
+
+Patterns are loaded as compact PatternRecord objects sharing one
+ProductInfo per product.
+"""
+
+import json
+import os
+import sys
+
+from pattern_bundle import bundled_products, load_bundle, pattern_metadata
+
+
+def load_patterns(patterns_dir, vendor=None, product=None, use_bundle=True, category=None, tags=None,
+                  use_catalog=False, where=None):
+    """Load patterns from the new by-vendor structure
+    
+    category and tags restrict loading to the products of that category and
+    the patterns carrying any of those tags. A fresh pattern bundle (see
+    build-pattern-bundle.py) is used instead of the individual JSON files
+    when one exists and use_bundle is set; its manifest lets only the
+    selected products be read. A vendor's few product files are read
+    directly, since checking the bundle is fresh stats every product file.
+    
+    With use_catalog, or with where, an extra SQL condition such as
+    "patterns.priority > 100", patterns are queried from the SQLite catalog
+    (see build-pattern-catalog.py) instead, which must be fresh.
+    """
+    by_vendor_dir = os.path.join(patterns_dir, 'by-vendor')
+    patterns = []
+    
+    if not os.path.exists(by_vendor_dir):
+        print("Error: by-vendor directory not found")
+        return patterns
+    
+    if use_catalog or where:
+        # Imported here so that loading without the catalog does not pay for sqlite3
+        import sqlite3
+        from pattern_catalog import open_catalog
+        
+        conn = open_catalog(patterns_dir)
+        if conn is None:
+            print("Error: pattern catalog missing or stale, run build-pattern-catalog.py")
+            return patterns
+        try:
+            return load_catalog_patterns(conn, patterns_dir, vendor, product, category, tags, where)
+        except sqlite3.Error as e:
+            print(f"Error querying pattern catalog: {e}")
+            return patterns
+        finally:
+            conn.close()
+    
+    if use_bundle and not vendor:
+        bundle = load_bundle(patterns_dir, category=category, tags=tags)
+        if bundle is not None:
+            return load_bundled_patterns(bundle, patterns_dir, tags)
+    
+    # If specific vendor/product specified, load only those
+    if vendor and product:
+        product_path = os.path.join(by_vendor_dir, vendor, f"{product}.json")
+        if os.path.exists(product_path):
+            try:
+                with open(product_path, 'r') as f:
+                    data = json.load(f)
+                patterns.extend(extract_patterns(data, category, tags,
+                                                 (patterns_dir, f"by-vendor/{vendor}/{product}.json")))
+            except Exception as e:
+                print(f"Error loading {product_path}: {e}")
+        else:
+            print(f"Product file not found: {product_path}")
+    elif vendor:
+        # Load all products for a vendor
+        vendor_path = os.path.join(by_vendor_dir, vendor)
+        if os.path.exists(vendor_path):
+            for product_file in os.listdir(vendor_path):
+                if product_file.endswith('.json'):
+                    product_path = os.path.join(vendor_path, product_file)
+                    try:
+                        with open(product_path, 'r') as f:
+                            data = json.load(f)
+                        patterns.extend(extract_patterns(data, category, tags,
+                                                         (patterns_dir, f"by-vendor/{vendor}/{product_file}")))
+                    except Exception as e:
+                        print(f"Error loading {product_path}: {e}")
+        else:
+            print(f"Vendor directory not found: {vendor_path}")
+    else:
+        # Load all patterns
+        for vendor_name in os.listdir(by_vendor_dir):
+            vendor_path = os.path.join(by_vendor_dir, vendor_name)
+            if os.path.isdir(vendor_path) and vendor_name != 'README.md':
+                for product_file in os.listdir(vendor_path):
+                    if product_file.endswith('.json'):
+                        product_path = os.path.join(vendor_path, product_file)
+                        try:
+                            with open(product_path, 'r') as f:
+                                data = json.load(f)
+                            patterns.extend(extract_patterns(
+                                data, category, tags, (patterns_dir, f"by-vendor/{vendor_name}/{product_file}")))
+                        except Exception as e:
+                            print(f"Error loading {product_path}: {e}")
+    
+    return patterns
+
+
+def preload_products(patterns_dir, metadata=False):
+    """Return {path: product data} for read_product(), from the bundle where it is faster
+    
+    A fresh bundle's match sections decode faster than the product files
+    parse, so they are used when the caller needs no pattern metadata.
+    Decoding the metadata sections as well is slower than parsing the
+    files, so with metadata {} is returned and read_product() reads them.
+    """
+    if metadata:
+        return {}
+    return bundled_products(patterns_dir, metadata=False)
+
+
+def load_bundled_patterns(bundle, patterns_dir, tags=None):
+    """Load patterns for load_patterns() from the products selected from a bundle"""
+    header, products = bundle
+    patterns = []
+    
+    for relpath, data in products:
+        patterns.extend(extract_patterns(data, tags=tags, source=(patterns_dir, relpath)))
+    
+    return patterns
+
+
+def load_catalog_patterns(conn, patterns_dir, vendor=None, product=None, category=None, tags=None, where=None):
+    """Load patterns for load_patterns() from a query on the pattern catalog"""
+    from pattern_catalog import select_patterns
+    
+    patterns = []
+    # ProductInfo by product file, for this load only
+    products = {}
+    rows = select_patterns(conn, vendor_id=vendor, product=product, category=category, tags=tags, where=where)
+    
+    for (path, vendor_name, product_name, product_category, position, version_range,
+         name, pattern, version_group, priority, confidence, scope) in rows:
+        info = products.get(path)
+        if info is None:
+            info = products[path] = product_info(
+                {'vendor': vendor_name, 'product': product_name, 'category': product_category}, (patterns_dir, path))
+        pattern_data = {
+            'name': name,
+            'pattern': pattern,
+            'version_group': version_group,
+            'priority': priority,
+            'confidence': confidence,
+            'scope': json.loads(scope) if scope else None
+        }
+        patterns.append(PatternRecord(info, position, pattern_data, version_range))
+    
+    return patterns
+
+
+def has_tags(pattern_data, tags):
+    """Return True if a pattern carries any of tags, or tags is empty"""
+    return not tags or any(tag in tags for tag in pattern_data.get('metadata', {}).get('tags', []))
+
+
+def extract_patterns(data, category=None, tags=None, source=None):
+    """Extract all patterns from a product file as PatternRecords
+    
+    Nothing is extracted from a product outside category, and only patterns
+    carrying any of tags are. source is (patterns_dir, relative path) of the
+    product file, which lets the records fetch their metadata on demand.
+    """
+    patterns = []
+    
+    if category and data.get('category', 'Unknown') != category:
+        return patterns
+    info = product_info(data, source)
+    position = 0
+    
+    # Extract all_versions patterns
+    for pattern_data in data.get('all_versions', []):
+        if has_tags(pattern_data, tags):
+            patterns.append(PatternRecord(info, position, pattern_data))
+        position += 1
+    
+    # Extract version-specific patterns
+    versions = data.get('versions', {})
+    for version_range, version_patterns in versions.items():
+        for pattern_data in version_patterns:
+            if has_tags(pattern_data, tags):
+                patterns.append(PatternRecord(info, position, pattern_data, version_range))
+            position += 1
+    
+    return patterns
+
+
+class ProductInfo:
+    """Vendor, product, category and source file shared by all patterns of a product"""
+    
+    __slots__ = ('vendor', 'product', 'category', 'patterns_dir', 'path')
+    
+    def __init__(self, vendor, product, category, patterns_dir=None, path=None):
+        self.vendor = sys.intern(vendor)
+        self.product = sys.intern(product)
+        self.category = sys.intern(category)
+        self.patterns_dir = patterns_dir
+        self.path = path
+
+
+def product_info(data, source=None):
+    """Return the ProductInfo for a product file, to be shared by its patterns"""
+    return ProductInfo(data.get('vendor', 'Unknown'), data.get('product', 'Unknown'), data.get('category', 'Unknown'),
+                       *(source or (None, None)))
+
+
+class PatternRecord:
+    """A loaded pattern, holding only what matching needs
+    
+    Vendor, product and category come from the shared ProductInfo instead
+    of being repeated in every record. Metadata is not kept; it is fetched
+    by pattern_id from the bundle or the product file when it is first
+    asked for. Records can be read like the dicts patterns used to be
+    loaded as, with pattern_data['name'] or pattern_data.get('scope'), so
+    code written against those dicts keeps working.
+    """
+    
+    __slots__ = ('info', 'position', 'name', 'pattern', 'version_group', 'priority', 'confidence', 'scope',
+                 'version_range')
+    
+    def __init__(self, info, position, pattern_data, version_range=None):
+        self.info = info
+        self.position = position
+        self.name = pattern_data.get('name', 'Unknown')
+        self.pattern = pattern_data.get('pattern', '')
+        self.version_group = pattern_data.get('version_group', 0)
+        self.priority = pattern_data.get('priority', 0)
+        self.confidence = pattern_data.get('confidence', 0.0)
+        self.scope = pattern_data.get('scope')
+        self.version_range = version_range
+    
+    @property
+    def vendor(self):
+        return self.info.vendor
+    
+    @property
+    def product(self):
+        return self.info.product
+    
+    @property
+    def category(self):
+        return self.info.category
+    
+    @property
+    def pattern_id(self):
+        """"<relative path>#<position>" of the pattern in its product file, or None if unknown"""
+        if self.info.path is None:
+            return None
+        return f"{self.info.path}#{self.position}"
+    
+    @property
+    def metadata(self):
+        """The pattern's metadata, read on demand"""
+        if self.info.path is None:
+            return {}
+        return pattern_metadata(self.info.patterns_dir, self.pattern_id)
+    
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+    
+    def __repr__(self):
+        return f"PatternRecord({self.vendor!r}, {self.product!r}, {self.name!r})"
+
+
+def pattern_key(pattern_data):
+    """Identify a pattern across runs by its product, name and regex"""
+    return (pattern_data['vendor'], pattern_data['product'], pattern_data['name'], pattern_data['pattern'])
@@ -0,0 +1,69 @@
+"""
+Batch matching on a process pool
+"""
+
+import multiprocessing
+import queue
+from collections import deque
+
+from .defaults import DEFAULT_CHUNK_SIZE
+from .pattern_set import PatternSet, iter_chunks, iter_inputs
+
+
+# Compiled pattern set of a pool worker, built once by init_worker()
+worker_pattern_set = None
+
+
+def init_worker(patterns_dir, vendor, product, options):
+    """Load and compile the pattern database once per worker process"""
+    global worker_pattern_set
+    worker_pattern_set = PatternSet.load(patterns_dir, vendor, product, **options)
+
+
+def match_chunk_in_worker(chunk):
+    """Match a chunk of inputs with the worker's pattern set"""
+    return worker_pattern_set.match_chunk(chunk)
+
+
+def parallel_match_batch(texts, workers, patterns_dir, vendor=None, product=None,
+                         chunk_size=None, ordered=True, **options):
+    """Match many texts on a process pool and yield {'id', 'results'} records
+    
+    Every worker loads and compiles the patterns once in its initializer and
+    then receives chunks of inputs. At most two chunks per worker are in
+    flight, so the input is read no faster than it is matched. Records are
+    yielded in input order, or as chunks complete when ordered is False.
+    """
+    chunks = iter_chunks(iter_inputs(texts), chunk_size or DEFAULT_CHUNK_SIZE)
+    max_pending = workers * 2
+    
+    with multiprocessing.Pool(workers, initializer=init_worker,
+                              initargs=(patterns_dir, vendor, product, options)) as pool:
+        if ordered:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(match_chunk_in_worker, (chunk,)))
+                if len(pending) >= max_pending:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
+            return
+        
+        completed = queue.Queue()
+        outstanding = 0
+        for chunk in chunks:
+            pool.apply_async(match_chunk_in_worker, (chunk,),
+                             callback=completed.put, error_callback=completed.put)
+            outstanding += 1
+            while outstanding >= max_pending or (outstanding and not completed.empty()):
+                records = completed.get()
+                outstanding -= 1
+                if isinstance(records, BaseException):
+                    raise records
+                yield from records
+        while outstanding:
+            records = completed.get()
+            outstanding -= 1
+            if isinstance(records, BaseException):
+                raise records
+            yield from records
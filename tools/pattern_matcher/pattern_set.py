@@ -0,0 +1,542 @@
+"""
+Compiled, reusable pattern sets and the matching API
+"""
+
+import mmap
+import os
+import re
+import threading
+
+from .analysis import (LiteralAutomaton, analyze_pattern, contains_opcode, normalize_scope, parse_pattern,
+                       pure_literal, required_literal, sre_constants)
+from .defaults import DEFAULT_CHUNK_SIZE, DEFAULT_PATTERNS_DIR, DEFAULT_WINDOW_SIZE, PREFILTER_LITERAL_LENGTH
+from .loader import load_patterns, pattern_key
+
+
+def extract_version(pattern_data, match):
+    """Extract the version from a regex match if version_group is specified"""
+    if pattern_data['version_group'] > 0 and pattern_data['version_group'] <= len(match.groups()):
+        return match.group(pattern_data['version_group'])
+    return None
+
+
+def build_result(pattern_data, matched_text, version=None):
+    """Build a result record for a matched pattern"""
+    return {
+        'vendor': pattern_data['vendor'],
+        'product': pattern_data['product'],
+        'name': pattern_data['name'],
+        'matched_text': matched_text,
+        'version': version,
+        'priority': pattern_data['priority'],
+        'confidence': pattern_data['confidence'],
+        'category': pattern_data['category'],
+        'pattern_id': pattern_data.get('pattern_id')
+    }
+
+
+class PatternSet:
+    """A set of patterns compiled once and reusable across many texts
+    
+    Patterns that are plain fixed strings, such as escaped WhatWeb `:text`
+    matches, take the literal path and never reach the regex engine.
+    
+    With prefilter enabled, the required literal of each pattern is loaded
+    into a LiteralAutomaton and a pattern's regex only runs on texts where
+    its literal occurs. Only the first PREFILTER_LITERAL_LENGTH characters of
+    each literal are loaded, which keeps the automaton small; a hit on a
+    literal-path pattern is a match on its own when the whole literal fits.
+    Patterns without a usable literal always run.
+    
+    match() runs every pattern against the whole text. match_response()
+    takes a structured response and honours each pattern's scope, so a
+    pattern scoped to a header only searches that header's line and a
+    pattern scoped to the body never searches the headers. Patterns whose
+    scope does not parse are collected in failed, like those whose regex
+    does not compile.
+    
+    With cache, a dict from pattern to its analyze_pattern() result, patterns
+    found in it are not parsed and compiled again, and the results for this
+    set are kept in self.analysis to serve as the cache of the next one. The
+    cache must come from a set built with the same prefilter setting.
+    """
+    
+    def __init__(self, patterns, prefilter=True, cache=None):
+        self.patterns = []
+        self.regexes = []
+        self.literals = []
+        self.failed = []
+        self.automaton = LiteralAutomaton(PREFILTER_LITERAL_LENGTH) if prefilter else None
+        self.unfiltered = []
+        self.byte_scanner = None
+        self.scopes = []
+        self.analysis = {} if cache is not None else None
+        
+        for pattern_data in patterns:
+            pattern = pattern_data['pattern']
+            if cache is None:
+                analysis = analyze_pattern(pattern, prefilter)
+            else:
+                analysis = self.analysis.get(pattern) or cache.get(pattern)
+                if analysis is None:
+                    analysis = analyze_pattern(pattern, prefilter)
+                self.analysis[pattern] = analysis
+            
+            literal, regex, prefilter_literal, error = analysis
+            if error is None:
+                try:
+                    scope = normalize_scope(pattern_data.get('scope'))
+                except ValueError as e:
+                    error = e
+            if error is not None:
+                self.failed.append((pattern_data, error))
+                continue
+            
+            index = len(self.patterns)
+            self.patterns.append(pattern_data)
+            self.regexes.append(regex)
+            self.literals.append(literal)
+            self.scopes.append(scope)
+            
+            if prefilter_literal:
+                self.automaton.add(prefilter_literal, index)
+            else:
+                self.unfiltered.append(index)
+        
+        if self.automaton:
+            self.automaton.build()
+    
+    @classmethod
+    def load(cls, patterns_dir, vendor=None, product=None, exclude=None, prefilter=True, **filters):
+        """Load and compile patterns from the by-vendor structure
+        
+        filters are passed on to load_patterns(). Patterns whose
+        pattern_key() is in exclude, such as quarantined ones, are left out.
+        """
+        patterns = load_patterns(patterns_dir, vendor, product, **filters)
+        if exclude:
+            patterns = [pattern_data for pattern_data in patterns if pattern_key(pattern_data) not in exclude]
+        return cls(patterns, prefilter)
+    
+    def __len__(self):
+        return len(self.patterns)
+    
+    def stats(self):
+        """Return how many patterns took the literal path, the regex path, or failed"""
+        literal_count = sum(1 for literal in self.literals if literal is not None)
+        return {
+            'literal': literal_count,
+            'regex': len(self.patterns) - literal_count,
+            'failed': len(self.failed)
+        }
+    
+    def candidates(self, text):
+        """Return indices of patterns that can match text, in load order"""
+        if self.automaton is None:
+            return self.unfiltered
+        return sorted(self.automaton.scan(text).union(self.unfiltered))
+    
+    def search(self, index, text):
+        """Search one pattern in text and return (matched_text, version) or None"""
+        literal = self.literals[index]
+        if literal is not None:
+            return (literal, None) if literal in text else None
+        
+        match = self.regexes[index].search(text)
+        if match:
+            return match.group(0), extract_version(self.patterns[index], match)
+        return None
+    
+    def match(self, text, skip=None, progress=None):
+        """Match all compiled patterns against text and return results
+        
+        Pattern indices in skip are not searched. If progress is given, it is
+        called with each pattern's index right before its search.
+        """
+        hits = []
+        
+        for index in self.candidates(text):
+            if skip and index in skip:
+                continue
+            
+            literal = self.literals[index]
+            if literal is not None and self.automaton is not None and self.automaton.exact(literal):
+                # Automaton hits on short fixed strings are already confirmed
+                hits.append((index, literal, None))
+                continue
+            
+            if progress:
+                progress(index)
+            hit = self.search(index, text)
+            if hit:
+                hits.append((index,) + hit)
+        
+        return self.build_results(hits)
+    
+    def match_response(self, record, skip=None, progress=None):
+        """Match a response record, searching each pattern only within its scope
+        
+        The automaton scans the full response once; each candidate is then
+        confirmed against just its scope target, and patterns scoped to a
+        status other than the response's are skipped.
+        """
+        status, header_lines, body = split_response(record)
+        header_block = '\r\n'.join(line for name, line in header_lines)
+        full_text = '\r\n\r\n'.join(part for part in (header_block, body) if part)
+        targets = {'body': body, 'headers': header_block}
+        header_targets = {}
+        
+        if self.automaton is None:
+            candidates = self.unfiltered
+        else:
+            candidates = sorted(self.automaton.scan(full_text).union(self.unfiltered))
+        
+        hits = []
+        for index in candidates:
+            if skip and index in skip:
+                continue
+            
+            scope = self.scopes[index]
+            text = full_text
+            if scope is not None:
+                search, header, scope_status = scope
+                if scope_status is not None and scope_status != status:
+                    continue
+                if header is not None:
+                    if header not in header_targets:
+                        header_targets[header] = '\r\n'.join(line for name, line in header_lines
+                                                             if name == header)
+                    text = header_targets[header]
+                elif search is not None:
+                    text = targets[search]
+                if search is not None and not text:
+                    continue
+            
+            literal = self.literals[index]
+            if (literal is not None and self.automaton is not None and self.automaton.exact(literal)
+                    and text is full_text):
+                # Automaton hits on short fixed strings are already confirmed
+                hits.append((index, literal, None))
+                continue
+            
+            if progress:
+                progress(index)
+            hit = self.search(index, text)
+            if hit:
+                hits.append((index,) + hit)
+        
+        return self.build_results(hits)
+    
+    def match_input(self, item, skip=None, progress=None):
+        """Match a plain text, or a response record with match_response()
+        
+        A record that only carries "text" has no structure to scope against
+        and is matched as plain text. Raises ValueError for a record whose
+        fields have the wrong type, see check_record().
+        """
+        if isinstance(item, dict):
+            check_record(item)
+            if 'text' in item:
+                return self.match(item['text'] or '', skip, progress)
+            return self.match_response(item, skip, progress)
+        return self.match(item, skip, progress)
+    
+    def build_results(self, hits):
+        """Turn (index, matched_text, version) hits into sorted result records"""
+        # Report hits in load order so equal priorities keep a stable order
+        hits.sort(key=lambda hit: hit[0])
+        results = [build_result(self.patterns[index], matched_text, version)
+                   for index, matched_text, version in hits]
+        
+        # Sort by priority (highest first)
+        results.sort(key=lambda x: x['priority'], reverse=True)
+        return results
+    
+    def scan_bytes(self, buffer, window_size=None):
+        """Match all patterns against a bytes-like buffer and return results"""
+        if self.byte_scanner is None:
+            self.byte_scanner = ByteScanner(self)
+        
+        hits = self.byte_scanner.scan(buffer, len(buffer), window_size or DEFAULT_WINDOW_SIZE)
+        return self.build_results(hits)
+    
+    def scan_file(self, path, window_size=None):
+        """Match all patterns against a file without reading it into memory
+        
+        The file is memory-mapped and scanned as bytes, and pages are released
+        as soon as they have been scanned, so memory stays flat regardless of
+        the file size.
+        """
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return self.scan_bytes(b'', window_size)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return self.scan_bytes(buffer, window_size)
+    
+    def match_chunk(self, chunk):
+        """Match a list of (input_id, text) pairs and return per-input results"""
+        return [{'id': input_id, 'results': self.match_input(item)} for input_id, item in chunk]
+    
+    def match_batch(self, texts, chunk_size=None):
+        """Match many texts and yield {'id', 'results'} records in input order
+        
+        texts may be any iterable of strings or response records, which are
+        numbered from 1, or of (input_id, item) pairs; records are matched
+        with match_response(). Inputs are consumed chunk_size at a time, so
+        a lazily produced iterable is never read into memory at once.
+        """
+        for chunk in iter_chunks(iter_inputs(texts), chunk_size or DEFAULT_CHUNK_SIZE):
+            for input_id, item in chunk:
+                yield {'id': input_id, 'results': self.match_input(item)}
+
+
+class ByteScanner:
+    """Bytes versions of a PatternSet's patterns for scanning large files
+    
+    Each pattern is recompiled from its UTF-8 encoding, so classes such as
+    \\d and \\w take their ASCII meaning. Patterns that cannot be compiled as
+    bytes are collected in failed and skipped.
+    
+    A pattern whose maximum match length is known is searched window by
+    window, each window extended by that length and two spare bytes so no
+    match is cut at a boundary and end anchors only match at the real end.
+    Patterns with unbounded length or lookarounds, which can look past the
+    end of their match, are searched over the whole input instead.
+    """
+    
+    def __init__(self, pattern_set):
+        self.pattern_set = pattern_set
+        self.literals = []
+        self.regexes = []
+        self.widths = []
+        self.failed = []
+        self.automaton = LiteralAutomaton() if pattern_set.automaton is not None else None
+        self.unfiltered = []
+        lookarounds = (sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+        
+        for index, pattern_data in enumerate(pattern_set.patterns):
+            pattern = pattern_data['pattern'].encode('utf-8')
+            parsed = parse_pattern(pattern)
+            literal = pure_literal(parsed) if parsed is not None else None
+            
+            regex = None
+            width = None
+            if literal:
+                literal = literal.encode('latin-1')
+                width = len(literal)
+            else:
+                literal = None
+                try:
+                    regex = re.compile(pattern)
+                except re.error as e:
+                    self.failed.append((pattern_data, e))
+                    parsed = None
+                else:
+                    maximum = parsed.getwidth()[1]
+                    if maximum < sre_constants.MAXREPEAT and not contains_opcode(parsed, lookarounds):
+                        width = maximum
+            
+            self.literals.append(literal)
+            self.regexes.append(regex)
+            self.widths.append(width)
+            
+            prefilter_literal = None
+            if self.automaton is not None and parsed is not None:
+                prefilter_literal = literal or required_literal(parsed)
+                if prefilter_literal and not isinstance(prefilter_literal, bytes):
+                    prefilter_literal = prefilter_literal.encode('latin-1')
+            if prefilter_literal:
+                self.automaton.add(prefilter_literal, index)
+            elif regex is not None or literal is not None:
+                self.unfiltered.append(index)
+        
+        if self.automaton:
+            self.automaton.build()
+    
+    def candidates(self, buffer, size, window_size):
+        """Stream the automaton over buffer and return candidate pattern indices"""
+        if self.automaton is None:
+            return list(self.unfiltered)
+        
+        found = set(self.unfiltered)
+        state = 0
+        for start in range(0, size, window_size):
+            state = self.automaton.feed(buffer[start:start + window_size], state, found)
+            release_pages(buffer, 0, start + window_size)
+        return sorted(found)
+    
+    def scan(self, buffer, size, window_size):
+        """Scan a bytes-like buffer and return (index, matched_text, version) hits"""
+        matches = {}
+        bounded = []
+        unbounded = []
+        
+        for index in self.candidates(buffer, size, window_size):
+            literal = self.literals[index]
+            if literal is not None:
+                if self.automaton is not None or buffer.find(literal) != -1:
+                    matches[index] = literal
+            elif self.widths[index] is not None and self.widths[index] <= window_size:
+                bounded.append(index)
+            else:
+                unbounded.append(index)
+        
+        # Search every bounded pattern in one window before moving to the next
+        for start in range(0, size, window_size):
+            end = start + window_size
+            for index in bounded:
+                if index in matches:
+                    continue
+                # $ can match at endpos or before a \n just before it, and \b looks one
+                # byte ahead: two spare bytes leave those to the final window, where
+                # endpos is the real end of the input
+                endpos = min(end + self.widths[index] + 2, size)
+                match = self.regexes[index].search(buffer, start, endpos)
+                if match and match.start() < end:
+                    matches[index] = match
+            release_pages(buffer, 0, start)
+        
+        for index in unbounded:
+            match = self.regexes[index].search(buffer)
+            if match:
+                matches[index] = match
+            release_pages(buffer, 0, size)
+        
+        hits = []
+        for index, match in matches.items():
+            if isinstance(match, bytes):
+                hits.append((index, match.decode('utf-8', 'replace'), None))
+                continue
+            version = extract_version(self.pattern_set.patterns[index], match)
+            if version is not None:
+                version = version.decode('utf-8', 'replace')
+            hits.append((index, match.group(0).decode('utf-8', 'replace'), version))
+        return hits
+
+
+def release_pages(buffer, start, end):
+    """Let the kernel drop already-scanned pages of a memory-mapped buffer"""
+    if not isinstance(buffer, mmap.mmap) or not hasattr(mmap, 'MADV_DONTNEED'):
+        return
+    start -= start % mmap.PAGESIZE
+    end = min(end, len(buffer))
+    if end > start:
+        buffer.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+def iter_inputs(texts):
+    """Yield (input_id, item) pairs, numbering bare strings and records from 1"""
+    for position, item in enumerate(texts, 1):
+        if isinstance(item, (str, dict)):
+            yield position, item
+        else:
+            input_id, text = item
+            yield input_id, text
+
+
+def iter_chunks(items, chunk_size):
+    """Yield lists of up to chunk_size items from an iterable"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def check_record(record):
+    """Raise ValueError if a text or response record has a field of the wrong type
+    
+    "text" and "body" must be strings or null, and "headers" an object, a
+    list of [name, value] pairs or a string, with string header names.
+    """
+    if 'text' in record:
+        if not isinstance(record['text'], (str, type(None))):
+            raise ValueError('"text" must be a string')
+        return
+    
+    if not isinstance(record.get('body'), (str, type(None))):
+        raise ValueError('"body" must be a string')
+    
+    headers = record.get('headers')
+    if isinstance(headers, dict):
+        names = list(headers)
+    elif isinstance(headers, list):
+        if not all(isinstance(pair, (list, tuple)) and len(pair) == 2 for pair in headers):
+            raise ValueError('"headers" must be a list of [name, value] pairs')
+        names = [name for name, value in headers]
+    elif isinstance(headers, (str, type(None))):
+        return
+    else:
+        raise ValueError('"headers" must be an object, a list or a string')
+    if not all(isinstance(name, str) for name in names):
+        raise ValueError('header names must be strings')
+
+
+def split_response(record):
+    """Split a response record into (status, header lines, body)
+    
+    "headers" may be an object, a list of [name, value] pairs or a raw
+    string. Header lines are returned as (lower-case name, "Name: value")
+    pairs, one per value.
+    """
+    status = record.get('status')
+    if status is not None:
+        try:
+            status = int(status)
+        except (TypeError, ValueError):
+            status = None
+    
+    header_lines = []
+    headers = record.get('headers')
+    if isinstance(headers, dict):
+        headers = list(headers.items())
+    if isinstance(headers, list):
+        for name, value in headers:
+            values = value if isinstance(value, list) else [value]
+            header_lines.extend((name.lower(), f"{name}: {item}") for item in values)
+    elif headers:
+        for line in str(headers).splitlines():
+            name = line.split(':', 1)[0].strip().lower() if ':' in line else ''
+            header_lines.append((name, line))
+    
+    return status, header_lines, record.get('body') or ''
+
+
+def report_failed(pattern_set, file=None):
+    """Print the patterns that could not be compiled or whose scope does not parse"""
+    for pattern_data, error in pattern_set.failed:
+        print(f"Invalid pattern: {pattern_data['pattern']} - {error}", file=file)
+
+
+def match_patterns(patterns, text):
+    """Match patterns against text and return results
+    
+    This compiles the patterns on every call; use PatternSet when matching
+    more than one text.
+    """
+    pattern_set = PatternSet(patterns)
+    report_failed(pattern_set)
+    return pattern_set.match(text)
+
+
+# Pattern set of the whole database used by match(), see default_pattern_set()
+default_set = None
+default_set_lock = threading.Lock()
+
+
+def default_pattern_set():
+    """Return a PatternSet of the whole pattern database, loading and compiling it on first use"""
+    global default_set
+    if default_set is None:
+        with default_set_lock:
+            if default_set is None:
+                default_set = PatternSet.load(DEFAULT_PATTERNS_DIR)
+    return default_set
+
+
+def match(item):
+    """Match a text or response record against the whole pattern database"""
+    return default_pattern_set().match_input(item)
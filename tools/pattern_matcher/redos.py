@@ -0,0 +1,396 @@
+"""
+Detection of regex patterns prone to catastrophic backtracking (ReDoS)
+
+The parsed structure of a pattern is searched for the shapes that make a
+backtracking engine super-linear when a match fails:
+
+- nested quantifiers, such as (a+)+, where an inner repeat at the end of a
+  repeated group can consume what starts the group's next iteration
+- overlapping quantifiers, such as \\s*.*\\s*, where adjacent repeats can
+  consume the same characters
+- ambiguous alternations under a star, such as (a|aa)+, where two
+  alternatives can start with the same character
+- leading repeats, such as .*Phusion_Passenger, which a failing search runs
+  again from every position of the input, rescanning it each time
+
+Each suspect comes with an adversarial input: a prefix reaching the
+suspect, a pump string repeated to grow the input, and suffixes making the
+match fail. confirm_suspect() times searches on ever longer inputs and
+reports the suspect when doubling the input length multiplies the search
+time by at least GROWTH_RATIO, which keeps the false positives of the
+structural checks out of the results. The verdict rests on how the time
+grows rather than on one reading against a fixed limit, so it does not
+depend on the speed of the machine.
+
+Leading repeats are at worst quadratic. One is also confirmed when a search
+takes longer than the threshold, and one that timing does not confirm is
+still returned, unconfirmed, so that it can be reported as a warning.
+"""
+
+import re
+import string
+import time
+from collections import namedtuple
+
+from .analysis import REPEAT_OPCODES, iter_subpatterns, parse_pattern, sre_constants
+from .defaults import DEFAULT_REDOS_LENGTH, DEFAULT_REDOS_THRESHOLD
+
+# Characters character sets are evaluated on, letters and digits first so that examples stay readable
+PROBE_CHARS = string.ascii_letters + string.digits + string.punctuation + ' \t\r\n\x0b\x0c\x00\xe9\xa0'
+
+# Characters tried after the pump string to make the match fail
+SUFFIX_CHARS = ('\x00', '!', '\n', ' ', 'a', '0')
+
+# Repeats that backtrack; possessive repeats and atomic groups do not
+BACKTRACKING_REPEATS = tuple(op for op in REPEAT_OPCODES
+                             if op is not getattr(sre_constants, 'POSSESSIVE_REPEAT', None))
+
+# Search time factor per doubling of the input that confirms a suspect: 2 is linear, 4 quadratic
+GROWTH_RATIO = 3.0
+
+# Timings of which the fastest is kept when measuring growth
+GROWTH_REPEATS = 3
+
+# Fraction of the threshold the longest search must reach for its growth to be measured reliably
+MEASURABLE_FRACTION = 0.01
+
+# Kinds of suspect that check_redos() returns unconfirmed when timing does not confirm them
+WARNING_KINDS = frozenset({'leading repeat'})
+
+CATEGORY_TESTS = {
+    sre_constants.CATEGORY_DIGIT: str.isdecimal,
+    sre_constants.CATEGORY_NOT_DIGIT: lambda char: not char.isdecimal(),
+    sre_constants.CATEGORY_SPACE: str.isspace,
+    sre_constants.CATEGORY_NOT_SPACE: lambda char: not char.isspace(),
+    sre_constants.CATEGORY_WORD: lambda char: char.isalnum() or char == '_',
+    sre_constants.CATEGORY_NOT_WORD: lambda char: not (char.isalnum() or char == '_'),
+}
+
+# A structural finding: kind, description, and the adversarial input it is timed with
+Suspect = namedtuple('Suspect', 'kind description prefix pump suffixes')
+
+# A timed suspect: the longest search, its input length, the time factor per doubling, and whether
+# timing confirmed it
+Finding = namedtuple('Finding', 'kind description seconds length growth confirmed')
+
+
+def is_unbounded(op, av):
+    """Return True if an opcode is a backtracking repeat without an upper bound"""
+    return op in BACKTRACKING_REPEATS and av[1] == sre_constants.MAXREPEAT
+
+
+def in_chars(items, ignorecase):
+    """Return the probe characters a character class matches"""
+    negate = bool(items) and items[0][0] is sre_constants.NEGATE
+    chars = set()
+    for char in PROBE_CHARS:
+        candidates = {char, char.swapcase()} if ignorecase else {char}
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                matched = any(ord(candidate) == av for candidate in candidates)
+            elif op is sre_constants.RANGE:
+                matched = any(av[0] <= ord(candidate) <= av[1] for candidate in candidates)
+            elif op is sre_constants.CATEGORY:
+                test = CATEGORY_TESTS.get(av)
+                matched = test is None or test(char)
+            else:
+                continue
+            if matched:
+                break
+        else:
+            matched = False
+        if matched != negate:
+            chars.add(char)
+    return frozenset(chars)
+
+
+def char_set(op, av, ignorecase):
+    """Return the probe characters a single-character opcode matches, or None for other opcodes"""
+    if op is sre_constants.LITERAL:
+        char = chr(av)
+        return frozenset(candidate for candidate in PROBE_CHARS
+                         if candidate == char or (ignorecase and candidate.swapcase() == char))
+    if op is sre_constants.NOT_LITERAL:
+        return frozenset(char for char in PROBE_CHARS if ord(char) != av)
+    if op is sre_constants.ANY:
+        return frozenset(char for char in PROBE_CHARS if char != '\n')
+    if op is sre_constants.IN:
+        return in_chars(av, ignorecase)
+    return None
+
+
+def consumed_chars(subpattern, ignorecase):
+    """Return the probe characters a parsed subpattern can consume anywhere"""
+    chars = set()
+    for op, av in subpattern:
+        single = char_set(op, av, ignorecase)
+        if single is not None:
+            chars |= single
+        elif op not in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            for nested in iter_subpatterns(av):
+                chars |= consumed_chars(nested, ignorecase)
+    return chars
+
+
+def item_first(op, av, ignorecase):
+    """Return (first characters, nullable) of a single parsed item"""
+    single = char_set(op, av, ignorecase)
+    if single is not None:
+        return single, False
+    if op is sre_constants.SUBPATTERN:
+        return first_chars(av[3], ignorecase)
+    if op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+        return first_chars(av, ignorecase)
+    if op in REPEAT_OPCODES:
+        chars, nullable = first_chars(av[2], ignorecase)
+        return chars, nullable or av[0] == 0
+    if op is sre_constants.BRANCH or op is sre_constants.GROUPREF_EXISTS:
+        chars, nullable = set(), op is sre_constants.GROUPREF_EXISTS
+        for nested in iter_subpatterns(av):
+            nested_chars, nested_nullable = first_chars(nested, ignorecase)
+            chars |= nested_chars
+            nullable = nullable or nested_nullable
+        return chars, nullable
+    # Anchors, lookarounds and backreferences
+    return set(), True
+
+
+def first_chars(subpattern, ignorecase):
+    """Return (characters a match can start with, whether it can be empty) of a parsed subpattern"""
+    chars = set()
+    for op, av in subpattern:
+        item_chars, nullable = item_first(op, av, ignorecase)
+        chars |= item_chars
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+def edge_repeats(items, ignorecase, reverse=False):
+    """Yield the unbounded repeats a sequence of items can start with, or end with if reverse is set
+    
+    Nullable items in front of them are looked through, and groups and
+    alternatives are searched recursively.
+    """
+    for op, av in (reversed(items) if reverse else items):
+        if is_unbounded(op, av):
+            yield av[2]
+        if op is sre_constants.SUBPATTERN:
+            yield from edge_repeats(av[3], ignorecase, reverse)
+        elif op is sre_constants.BRANCH:
+            for alternative in av[1]:
+                yield from edge_repeats(alternative, ignorecase, reverse)
+        elif op in REPEAT_OPCODES:
+            yield from edge_repeats(av[2], ignorecase, reverse)
+        if not item_first(op, av, ignorecase)[1]:
+            return
+
+
+def example(subpattern, ignorecase, prefer=frozenset()):
+    """Return a short string a parsed subpattern matches, using characters of prefer where possible"""
+    parts = []
+    for op, av in subpattern:
+        single = char_set(op, av, ignorecase)
+        if single is not None:
+            chosen = [char for char in PROBE_CHARS if char in single and char in prefer] or \
+                     [char for char in PROBE_CHARS if char in single]
+            parts.append(chosen[0] if chosen else '')
+        elif op is sre_constants.SUBPATTERN:
+            parts.append(example(av[3], ignorecase, prefer))
+        elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+            parts.append(example(av, ignorecase, prefer))
+        elif op in REPEAT_OPCODES:
+            parts.append(example(av[2], ignorecase, prefer) * max(av[0], 0))
+        elif op is sre_constants.BRANCH:
+            parts.append(example(av[1][0], ignorecase, prefer))
+    return ''.join(parts)
+
+
+def pick(chars):
+    """Return the first probe character of a set"""
+    return next(char for char in PROBE_CHARS if char in chars)
+
+
+def failing_suffixes(pump):
+    """Return characters to end an adversarial input with, preferring ones the pump does not contain"""
+    return tuple(char for char in SUFFIX_CHARS if char not in pump) or SUFFIX_CHARS
+
+
+def find_suspects(pattern):
+    """Return the Suspects of catastrophic backtracking in a pattern, or [] if it does not parse"""
+    parsed = parse_pattern(pattern)
+    if parsed is None:
+        return []
+    suspects = []
+    ignorecase = bool(parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE)
+    walk(parsed, '', ignorecase, suspects)
+    
+    for leading in edge_repeats(parsed, ignorecase):
+        pump = pick(consumed_chars(leading, ignorecase) or PROBE_CHARS)
+        suspects.append(Suspect('leading repeat',
+                                "the pattern starts with a repeat, which a failing search rescans the "
+                                "input with from every position", '', pump, failing_suffixes(pump)))
+        break
+    return suspects
+
+
+def walk(items, prefix, ignorecase, suspects):
+    """Collect the suspects of a sequence of parsed items reached after matching prefix"""
+    for index, (op, av) in enumerate(items):
+        if is_unbounded(op, av):
+            check_repeat(av[2], prefix, ignorecase, suspects)
+            check_adjacent(items, index, prefix, ignorecase, suspects)
+        
+        if op is sre_constants.SUBPATTERN:
+            walk(av[3], prefix, ignorecase, suspects)
+        elif op is sre_constants.BRANCH:
+            for alternative in av[1]:
+                walk(alternative, prefix, ignorecase, suspects)
+        elif op in BACKTRACKING_REPEATS:
+            walk(av[2], prefix, ignorecase, suspects)
+        elif op is sre_constants.GROUPREF_EXISTS:
+            for nested in iter_subpatterns(av):
+                walk(nested, prefix, ignorecase, suspects)
+        prefix += example([(op, av)], ignorecase)
+
+
+def check_repeat(body, prefix, ignorecase, suspects):
+    """Look for nested quantifiers and ambiguous alternations in the body of an unbounded repeat"""
+    starts, nullable = first_chars(body, ignorecase)
+    
+    for inner in edge_repeats(body, ignorecase, reverse=True):
+        overlap = consumed_chars(inner, ignorecase) & starts
+        if overlap or nullable:
+            pump = example(body, ignorecase, overlap) or pick(consumed_chars(inner, ignorecase) or PROBE_CHARS)
+            suspects.append(Suspect('nested quantifier',
+                                    "a repeated group ends in a repeat that can consume the start of "
+                                    "the group's next iteration", prefix, pump, failing_suffixes(pump)))
+            break
+    
+    for alternatives in iter_branches(body):
+        # An alternative that can match nothing is followed by the group's next iteration
+        firsts = []
+        for alternative in alternatives:
+            chars, empty = first_chars(alternative, ignorecase)
+            firsts.append(chars | starts if empty else chars)
+        for position, chars in enumerate(firsts):
+            overlap = next((chars & other for other in firsts[position + 1:] if chars & other), None)
+            if overlap:
+                pump = example(alternatives[position], ignorecase, overlap) or pick(overlap)
+                suspects.append(Suspect('ambiguous alternation',
+                                        "alternatives under a repeat can start with the same character",
+                                        prefix, pump, failing_suffixes(pump)))
+                return
+
+
+def iter_branches(items):
+    """Yield the alternatives of every alternation in a sequence of parsed items, outside nested repeats"""
+    for op, av in items:
+        if op is sre_constants.BRANCH:
+            yield av[1]
+            for alternative in av[1]:
+                yield from iter_branches(alternative)
+        elif op is sre_constants.SUBPATTERN:
+            yield from iter_branches(av[3])
+
+
+def check_adjacent(items, index, prefix, ignorecase, suspects):
+    """Look for a repeat after items[index] that can consume the same characters as it"""
+    chars = consumed_chars(items[index][1][2], ignorecase)
+    for following in edge_repeats(items[index + 1:], ignorecase):
+        overlap = chars & consumed_chars(following, ignorecase)
+        if overlap:
+            pump = pick(overlap)
+            suspects.append(Suspect('overlapping quantifiers',
+                                    "adjacent repeats can consume the same characters",
+                                    prefix, pump, failing_suffixes(pump)))
+            return
+
+
+def time_search(regex, text, repeats=1):
+    """Return the seconds the fastest of repeats searches of text takes"""
+    fastest = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        regex.search(text)
+        seconds = time.perf_counter() - start
+        fastest = seconds if fastest is None else min(fastest, seconds)
+    return fastest
+
+
+def confirm_suspect(regex, suspect, threshold=DEFAULT_REDOS_THRESHOLD, max_length=DEFAULT_REDOS_LENGTH):
+    """Time a suspect on growing adversarial inputs and return (confirmed, seconds, length, growth)
+    
+    The input grows until a search takes longer than threshold seconds or
+    the input reaches max_length characters. It doubles while searches are
+    far below the threshold and then grows by an eighth, so that an
+    exponential pattern overshoots the threshold by a bounded factor rather
+    than running for hours. Once searches take measurable time, only the
+    suffixes that make them slowest are kept.
+    
+    The slowest input and the one with half as many pumps are then timed
+    again, and growth is the ratio of their times: about 2 for a linear
+    search, 4 for a quadratic one and far more for an exponential one. The
+    suspect is confirmed when growth reaches GROWTH_RATIO and the longer
+    search takes at least MEASURABLE_FRACTION of threshold.
+    """
+    repeats = 8
+    suffixes = suspect.suffixes
+    while True:
+        body = suspect.prefix + suspect.pump * repeats
+        timings = [(time_search(regex, body + suffix), suffix) for suffix in suffixes]
+        slowest, suffix = max(timings)
+        if slowest > threshold or len(body) >= max_length:
+            break
+        
+        if slowest >= threshold / 1000:
+            suffixes = tuple(suffix for seconds, suffix in timings if seconds >= slowest / 2)
+        if slowest < threshold / 1000:
+            grown = repeats * 2
+        elif slowest < threshold / 10:
+            grown = repeats + repeats // 4
+        else:
+            grown = repeats + repeats // 8
+        longest = (max_length - len(suspect.prefix) + len(suspect.pump) - 1) // len(suspect.pump)
+        repeats = max(repeats + 1, min(grown, longest))
+    
+    # A search far over the threshold is not worth repeating; noise cannot hide its growth
+    if slowest <= threshold:
+        slowest = min(slowest, time_search(regex, body + suffix, GROWTH_REPEATS - 1))
+    shorter = time_search(regex, suspect.prefix + suspect.pump * (repeats // 2) + suffix, GROWTH_REPEATS)
+    growth = slowest / max(shorter, 1e-9)
+    confirmed = growth >= GROWTH_RATIO and slowest >= threshold * MEASURABLE_FRACTION
+    return confirmed, slowest, len(body) + 1, growth
+
+
+def check_redos(pattern, threshold=DEFAULT_REDOS_THRESHOLD, max_length=DEFAULT_REDOS_LENGTH):
+    """Return the Findings of suspects in a pattern that timing confirms, or [] if it looks safe
+    
+    Adversarial inputs grow to at most max_length characters, or until a
+    search takes threshold seconds, and a suspect is confirmed when its
+    search time grows super-linearly with the input, see confirm_suspect().
+    A suspect of WARNING_KINDS is also confirmed when its search takes longer
+    than threshold, and is returned with confirmed set to False otherwise.
+    """
+    suspects = find_suspects(pattern)
+    if not suspects:
+        return []
+    try:
+        regex = re.compile(pattern)
+    except re.error:
+        return []
+    
+    findings = []
+    tried = set()
+    for suspect in suspects:
+        key = (suspect.prefix, suspect.pump)
+        if key in tried:
+            continue
+        tried.add(key)
+        confirmed, seconds, length, growth = confirm_suspect(regex, suspect, threshold, max_length)
+        if suspect.kind in WARNING_KINDS:
+            confirmed = confirmed or seconds > threshold
+        elif not confirmed:
+            continue
+        findings.append(Finding(suspect.kind, suspect.description, seconds, length, growth, confirmed))
+    return findings
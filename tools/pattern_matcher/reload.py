@@ -0,0 +1,175 @@
+"""
+Hot reload of a pattern set from the changed product files
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from build_state import default_state_path, diff_sources, load_state, scan_sources, sources_digest
+from pattern_bundle import find_product_files
+
+from .defaults import DEFAULT_RELOAD_INTERVAL
+from .loader import extract_patterns, load_patterns, pattern_key
+from .pattern_set import PatternSet
+
+
+def content_key(pattern_data):
+    """Identify a loaded pattern by its product file and content rather than its position"""
+    return pattern_data.info.path, pattern_data.name, pattern_data.pattern, pattern_data.version_range
+
+
+def loaded_keys(pattern_set, failed_only=False):
+    """Return a Counter of the content_key() of a set's patterns, including those that failed
+    
+    Inserting a pattern into a product file shifts the positions of the ones
+    after it, which do not count as changed because keys leave positions out.
+    """
+    keys = Counter(content_key(pattern_data) for pattern_data, e in pattern_set.failed)
+    if not failed_only:
+        keys.update(content_key(pattern_data) for pattern_data in pattern_set.patterns)
+    return keys
+
+
+class PatternReloader:
+    """Keep a PatternSet in step with the product files under patterns/by-vendor
+    
+    A background thread checks the product files every interval seconds,
+    one stat per file, and hashes only those whose size or mtime changed.
+    When contents changed, only the changed products are read again; a new
+    PatternSet is built reusing the compiled patterns of the current one, so
+    only new or modified patterns are parsed and compiled. The new set then
+    replaces self.pattern_set in a single assignment: callers that took the
+    old set finish their matches on it and nothing waits for the reload.
+    
+    A product file that cannot be read keeps its previous patterns, and its
+    previous state, so that it is read again at the next check. self.last_reload describes the most recent reload: its
+    duration, the patterns added and removed (a modified pattern counts as
+    both), the patterns that failed to compile and the unreadable files.
+    on_reload, if given, is called with the reloader after every reload.
+    """
+    
+    def __init__(self, patterns_dir, vendor=None, product=None, category=None, tags=None, exclude=None,
+                 prefilter=True, use_bundle=True, interval=DEFAULT_RELOAD_INTERVAL,
+                 on_reload=None):
+        self.patterns_dir = patterns_dir
+        self.vendor = vendor
+        self.product = product
+        self.category = category
+        self.tags = tags
+        self.exclude = exclude
+        self.prefilter = prefilter
+        self.interval = interval
+        self.on_reload = on_reload
+        self.reloads = 0
+        self.last_reload = None
+        self.stopped = threading.Event()
+        self.thread = None
+        
+        # Take the file states first, so changes made while loading are picked up by the first check
+        record = load_state(default_state_path(patterns_dir))['artifacts'].get('bundle') or {}
+        self.sources = scan_sources(patterns_dir, find_product_files(patterns_dir), record.get('files'))
+        self.products = {}
+        for pattern_data in load_patterns(patterns_dir, vendor, product, use_bundle, category, tags):
+            self.products.setdefault(pattern_data.info.path, []).append(pattern_data)
+        self.pattern_set = PatternSet(self.records(), prefilter, cache={})
+        self.version = sources_digest(self.sources)
+    
+    def records(self):
+        """Return the loaded patterns of all products, leaving out excluded ones"""
+        patterns = [pattern_data for relpath in sorted(self.products) for pattern_data in self.products[relpath]]
+        if self.exclude:
+            patterns = [pattern_data for pattern_data in patterns if pattern_key(pattern_data) not in self.exclude]
+        return patterns
+    
+    def selects(self, relpath):
+        """Return True if the vendor and product filters select a product file"""
+        parts = relpath.split('/')
+        if self.vendor and parts[1] != self.vendor:
+            return False
+        return not self.product or parts[2] == f"{self.product}.json"
+    
+    def check(self):
+        """Reload the changed product files, if any, and return True if there were any"""
+        start = time.perf_counter()
+        sources = scan_sources(self.patterns_dir, find_product_files(self.patterns_dir), self.sources)
+        changed, removed = diff_sources(self.sources, sources)
+        if not changed and not removed:
+            self.sources = sources
+            return False
+        
+        products = dict(self.products)
+        unreadable = []
+        for relpath in removed:
+            products.pop(relpath, None)
+        for relpath in changed:
+            if not self.selects(relpath):
+                continue
+            product_path = os.path.join(self.patterns_dir, relpath)
+            try:
+                with open(product_path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError, UnicodeDecodeError) as e:
+                print(f"Error loading {product_path}: {e}")
+                unreadable.append(relpath)
+                # Keep the state the loaded patterns came from, so the version does not move
+                if relpath in self.sources:
+                    sources[relpath] = self.sources[relpath]
+                else:
+                    del sources[relpath]
+                continue
+            patterns = extract_patterns(data, self.category, self.tags, (self.patterns_dir, relpath))
+            if patterns:
+                products[relpath] = patterns
+            else:
+                products.pop(relpath, None)
+        
+        old_set = self.pattern_set
+        self.products = products
+        pattern_set = PatternSet(self.records(), self.prefilter, cache=old_set.analysis)
+        old_keys = loaded_keys(old_set)
+        new_keys = loaded_keys(pattern_set)
+        old_failed = loaded_keys(old_set, failed_only=True)
+        
+        self.pattern_set = pattern_set
+        self.sources = sources
+        self.version = sources_digest(sources)
+        self.reloads += 1
+        self.last_reload = {
+            'version': self.version,
+            'finished_at': time.time(),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+            'files': len(changed) + len(removed),
+            'added': sum((new_keys - old_keys).values()),
+            'removed': sum((old_keys - new_keys).values()),
+            'failed': sum((loaded_keys(pattern_set, failed_only=True) - old_failed).values()),
+            'unreadable': unreadable
+        }
+        if self.on_reload:
+            self.on_reload(self)
+        return True
+    
+    def run(self):
+        """Check for changes every interval seconds until stopped"""
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                # Keep serving the current set; the next check retries
+                print(f"Error reloading patterns: {e}")
+    
+    def start(self):
+        """Start checking for changes in a background thread"""
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name='pattern-reloader', daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Stop the background thread"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,255 @@
+"""
+Matching daemon answering JSON match requests over HTTP
+"""
+
+import http.server
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+from collections import deque
+
+from .defaults import LATENCY_WINDOW
+
+
+def check_input(item):
+    """Return a daemon request input if it is a text or a record, else raise ValueError"""
+    if not isinstance(item, (str, dict)):
+        raise ValueError("an input must be a string or an object")
+    return item
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of a sorted list, or None if it is empty"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class MatchService:
+    """A compiled pattern set kept warm by the matching daemon
+    
+    match() answers one request body and status() reports the pattern set,
+    request counters and latency percentiles over the last LATENCY_WINDOW
+    requests. Requests may be served from several threads at once.
+    
+    With a PatternReloader, reloaded() swaps in each reloaded set and
+    status() also reports the reloads.
+    """
+    
+    def __init__(self, pattern_set, version=None, reloader=None):
+        self.current = (pattern_set, version)
+        self.reloader = reloader
+        self.started = time.time()
+        self.requests = 0
+        self.inputs = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+    
+    def match(self, request):
+        """Match a request body and return (response body, number of inputs)
+        
+        A request is a single input, a JSON string or a record as accepted by
+        --jsonl, answered with {"results": [...]}, or {"inputs": [...]},
+        answered with {"results": [[...], ...]} in input order.
+        """
+        # One read, so a request is answered entirely from one pattern set even during a reload
+        pattern_set, version = self.current
+        if isinstance(request, dict) and 'inputs' in request:
+            inputs = request['inputs']
+            if not isinstance(inputs, list):
+                raise ValueError('"inputs" must be a list')
+            results = [pattern_set.match_input(check_input(item)) for item in inputs]
+            return {'version': version, 'results': results}, len(inputs)
+        return {'version': version, 'results': pattern_set.match_input(check_input(request))}, 1
+    
+    def reloaded(self, reloader):
+        """Swap in a reloader's new pattern set; requests in flight finish on the old one"""
+        self.current = (reloader.pattern_set, reloader.version)
+    
+    def record(self, seconds, inputs, error=False):
+        """Count a served request and its latency"""
+        with self.lock:
+            self.requests += 1
+            self.inputs += inputs
+            self.errors += error
+            self.latencies.append(seconds)
+    
+    def status(self):
+        """Return the daemon's pattern set version, counters and latency percentiles"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            counters = {'requests': self.requests, 'inputs': self.inputs, 'errors': self.errors}
+        
+        pattern_set, version = self.current
+        latency_ms = {}
+        for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0)):
+            value = percentile(latencies, fraction)
+            latency_ms[name] = round(value * 1000, 3) if value is not None else None
+        
+        status = dict(version=version, patterns=len(pattern_set), failed_patterns=len(pattern_set.failed),
+                      uptime=round(time.time() - self.started, 1), latency_ms=latency_ms, **counters)
+        
+        if self.reloader is not None:
+            status['reloads'] = self.reloader.reloads
+            status['last_reload'] = self.reloader.last_reload
+        return status
+
+
+class MatchRequestHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP handler of the matching daemon: POST /match and GET /status
+    
+    Connections are kept alive, so a client can send many requests without
+    paying for a new connection each time.
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def setup(self):
+        # Small responses must not wait on Nagle's algorithm; Unix sockets have no such option
+        self.disable_nagle_algorithm = self.server.address_family != socket.AF_UNIX
+        super().setup()
+    
+    def do_GET(self):
+        if self.path != '/status':
+            self.send_json(404, {'error': f"unknown path {self.path}"})
+            return
+        self.send_json(200, self.server.service.status())
+    
+    def do_POST(self):
+        if self.path != '/match':
+            self.send_json(404, {'error': f"unknown path {self.path}"})
+            return
+        
+        service = self.server.service
+        start = time.perf_counter()
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            response, inputs = service.match(json.loads(self.rfile.read(length)))
+        except (ValueError, TypeError) as e:
+            service.record(time.perf_counter() - start, 0, error=True)
+            self.send_json(400, {'error': str(e)})
+            return
+        
+        body = json.dumps(response).encode('utf-8')
+        service.record(time.perf_counter() - start, inputs)
+        self.send_body(200, body)
+    
+    def send_json(self, status, body):
+        """Send a JSON response body"""
+        self.send_body(status, json.dumps(body).encode('utf-8'))
+    
+    def send_body(self, status, body):
+        """Send an encoded JSON response body"""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        """Keep per-request logging off the latency path"""
+        pass
+
+
+class MatchServer(http.server.ThreadingHTTPServer):
+    """Matching daemon listening on a TCP address"""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, service):
+        self.service = service
+        super().__init__(address, MatchRequestHandler)
+
+
+class UnixMatchServer(MatchServer):
+    """Matching daemon listening on a Unix socket"""
+    
+    address_family = socket.AF_UNIX
+    
+    def server_bind(self):
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+    
+    def get_request(self):
+        request, address = self.socket.accept()
+        return request, ('local', 0)
+
+
+def is_socket(path):
+    """Return True if path is a socket file, without following symlinks"""
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except OSError:
+        return False
+
+
+def check_address(address):
+    """Return the Unix socket path or the (host, port) pair of a daemon address
+    
+    An address containing '/' is a socket path; anything else must be
+    'host:port' or ':port'. Raises ValueError for an address without a valid
+    port, and for a socket path where a file other than a socket exists.
+    """
+    if '/' in address:
+        if os.path.lexists(address) and not is_socket(address):
+            raise ValueError(f"{address} exists and is not a socket, refusing to replace it")
+        return address
+    
+    host, separator, port = address.rpartition(':')
+    if not separator or not port.isdigit() or int(port) > 65535:
+        raise ValueError(f"invalid address {address!r}, expected host:port or a Unix socket path")
+    return host or '127.0.0.1', int(port)
+
+
+def make_server(address, service):
+    """Create a matching daemon for a 'host:port' address or a Unix socket path
+    
+    A stale socket file left at the path by an earlier daemon is replaced;
+    see check_address() for the addresses that are refused.
+    """
+    address = check_address(address)
+    if isinstance(address, str):
+        if is_socket(address):
+            os.remove(address)
+        return UnixMatchServer(address, service)
+    return MatchServer(address, service)
+
+
+def serve(pattern_set, address, version=None, reloader=None, file=None):
+    """Run the matching daemon for a compiled pattern set until interrupted or terminated
+    
+    With a PatternReloader, its reloaded sets are swapped in as they come.
+    """
+    service = MatchService(pattern_set, version, reloader)
+    server = make_server(address, service)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    if reloader is not None:
+        def reloaded(reloader):
+            service.reloaded(reloader)
+            metrics = reloader.last_reload
+            print(f"Reloaded {metrics['files']} product files in {metrics['duration_ms']:.0f} ms: "
+                  f"{metrics['added']} patterns added, {metrics['removed']} removed, {metrics['failed']} failed "
+                  f"(version {metrics['version']})", file=file)
+        reloader.on_reload = reloaded
+        reloader.start()
+    
+    print(f"Serving {len(pattern_set)} patterns (version {version}) on {address}", file=file)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if reloader is not None:
+            reloader.stop()
+        server.server_close()
+        if isinstance(server, UnixMatchServer) and is_socket(address):
+            os.remove(address)
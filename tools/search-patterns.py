@@ -4,10 +4,12 @@ Search for patterns by vendor or product in the new by-vendor structure
 """
 
 import os
-import json
 import sys
 import re
 
+from pattern_bundle import read_product
+from pattern_matcher.loader import preload_products
+
 
 def search_patterns(patterns_dir, search_term):
     """Search for patterns by vendor or product name"""
@@ -22,6 +24,8 @@ def search_patterns(patterns_dir, search_term):
     
     matches = []
     
+    products = preload_products(patterns_dir)
+    
     # Walk through vendor directories
     for vendor in os.listdir(by_vendor_dir):
         vendor_path = os.path.join(by_vendor_dir, vendor)
@@ -37,12 +41,11 @@ def search_patterns(patterns_dir, search_term):
         for product_file in os.listdir(vendor_path):
             if not product_file.endswith('.json'):
                 continue
-                
+            
             product_path = os.path.join(vendor_path, product_file)
             
             try:
-                with open(product_path, 'r') as f:
-                    data = json.load(f)
+                data = read_product(product_path, products)
                 
                 product_name = data.get('product', '')
                 category = data.get('category', '')
@@ -50,7 +53,7 @@ def search_patterns(patterns_dir, search_term):
                 # Check if product name matches
                 if re.search(search_term, product_name, re.IGNORECASE):
                     matches.append(('product', f"{vendor}/{product_name} ({category})", product_path))
-                    
+            
             except Exception as e:
                 print(f"Error reading {product_path}: {e}")
     
@@ -63,8 +66,7 @@ def search_patterns(patterns_dir, search_term):
             # Show pattern count for products
             if match_type == 'product':
                 try:
-                    with open(path, 'r') as f:
-                        data = json.load(f)
+                    data = read_product(path, products)
                     
                     all_versions_count = len(data.get('all_versions', []))
                     version_patterns_count = 0
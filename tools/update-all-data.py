@@ -16,6 +16,10 @@ import subprocess
 from pathlib import Path
 from collections import defaultdict
 
+from pattern_bundle import read_product
+from pattern_catalog import catalog_statistics
+from pattern_matcher.loader import preload_products
+
 def find_pattern_files(root_dir):
     """Find all pattern files in the repository."""
     pattern_files = []
@@ -28,7 +32,7 @@ def find_pattern_files(root_dir):
     
     return pattern_files
 
-def analyze_patterns(pattern_files):
+def analyze_patterns(pattern_files, products=None):
     """Analyze all patterns and generate statistics."""
     # Statistics counters
     total_patterns = 0
@@ -40,12 +44,11 @@ def analyze_patterns(pattern_files):
     
     # Process each pattern file
     for pattern_file in pattern_files:
-        with open(pattern_file, 'r') as f:
-            try:
-                pattern_data = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"Error parsing {pattern_file}: {e}")
-                continue
+        try:
+            pattern_data = read_product(pattern_file, products)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing {pattern_file}: {e}")
+            continue
         
         # Extract vendor and product information
         vendor = pattern_data.get('vendor', 'unknown')
@@ -133,19 +136,18 @@ def generate_report(stats):
     
     return "\n".join(report)
 
-def extract_vendors_and_products(pattern_files):
+def extract_vendors_and_products(pattern_files, bundled=None):
     """Extract unique vendors and products from pattern files."""
     vendors = {}
     products = {}
     
     # Process each pattern file
     for pattern_file in pattern_files:
-        with open(pattern_file, 'r') as f:
-            try:
-                pattern_data = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"Error parsing {pattern_file}: {e}")
-                continue
+        try:
+            pattern_data = read_product(pattern_file, bundled)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing {pattern_file}: {e}")
+            continue
         
         # Extract vendor information
         vendor_id = pattern_data.get('vendor_id', 'unknown')
@@ -277,6 +279,7 @@ def main():
     script_dir = os.path.dirname(os.path.abspath(__file__))
     repo_root = os.path.dirname(script_dir)
     data_dir = os.path.join(repo_root, 'data')
+    patterns_dir = os.path.join(repo_root, 'patterns')
     
     print("Updating all data files and statistics...")
     
@@ -289,14 +292,16 @@ def main():
     
     print(f"Found {len(pattern_files)} pattern files to analyze")
     
-    # Analyze patterns for statistics
-    stats = analyze_patterns(pattern_files)
+    # Analyze patterns for statistics, with a query on the pattern catalog when it is fresh
+    stats = catalog_statistics(patterns_dir)
+    if stats is None:
+        stats = analyze_patterns(pattern_files, preload_products(patterns_dir, metadata=True))
     
     # Update summary file
     summary_file = update_summary_file(stats, repo_root)
     
     # Extract vendors and products
-    vendors, products = extract_vendors_and_products(pattern_files)
+    vendors, products = extract_vendors_and_products(pattern_files, preload_products(patterns_dir))
     
     # Update data files
     update_vendors_file(vendors, data_dir)
@@ -11,6 +11,9 @@ import os
 from pathlib import Path
 from collections import defaultdict
 
+from pattern_bundle import read_product
+from pattern_matcher.loader import preload_products
+
 def find_pattern_files(root_dir):
     """Find all pattern files in the repository."""
     pattern_files = []
@@ -23,19 +26,18 @@ def find_pattern_files(root_dir):
     
     return pattern_files
 
-def extract_vendors_and_products(pattern_files):
+def extract_vendors_and_products(pattern_files, bundled=None):
     """Extract unique vendors and products from pattern files."""
     vendors = {}
     products = {}
     
     # Process each pattern file
     for pattern_file in pattern_files:
-        with open(pattern_file, 'r') as f:
-            try:
-                pattern_data = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"Error parsing {pattern_file}: {e}")
-                continue
+        try:
+            pattern_data = read_product(pattern_file, bundled)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing {pattern_file}: {e}")
+            continue
         
         # Extract vendor information
         vendor_id = pattern_data.get('vendor_id', 'unknown')
@@ -156,6 +158,7 @@ def main():
     script_dir = os.path.dirname(os.path.abspath(__file__))
     repo_root = os.path.dirname(script_dir)
     data_dir = os.path.join(repo_root, 'data')
+    patterns_dir = os.path.join(repo_root, 'patterns')
     
     # Find all pattern files
     pattern_files = find_pattern_files(repo_root)
@@ -167,7 +170,7 @@ def main():
     print(f"Found {len(pattern_files)} pattern files to analyze")
     
     # Extract vendors and products
-    vendors, products = extract_vendors_and_products(pattern_files)
+    vendors, products = extract_vendors_and_products(pattern_files, preload_products(patterns_dir))
     
     # Update data files
     update_vendors_file(vendors, data_dir)
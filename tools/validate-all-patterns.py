@@ -1,14 +1,63 @@
 #!/usr/bin/env python3
 """
 Validation script to validate all pattern files in the repository
+
+Files are validated in path order, in this process or with --jobs N on a
+pool of N worker processes. Each file's errors are printed together, in
+path order whatever the number of jobs, and --json writes a summary of
+the failures and timings for CI to pick up.
+
+Given files, or with --changed a git revision range, only those pattern
+files are validated. The checks that span files, such as two files
+declaring the same vendor_id and product_id, run against the cached
+validation index (see validation_index.py) instead of every file, so an
+incremental run costs time in proportion to the change.
+
+With --run-tests the test_cases of every pattern are run as well: each
+pattern is compiled once and searched in its test inputs, and the version
+it captures must equal expected_version ("unknown" when it captures none).
+The time each pattern spends on its searches is recorded, and the slowest
+patterns are listed alongside the failures.
+
+With --redos every pattern is checked for catastrophic backtracking: its
+parsed structure is searched for nested or overlapping quantifiers,
+ambiguous alternations under a repeat and leading repeats, and each suspect
+is timed on generated adversarial inputs (see pattern_matcher/redos.py).
+Inputs grow to --redos-length characters, or until a search takes
+--redos-threshold milliseconds, and a pattern fails when doubling the input
+at least triples the time of its search. A leading repeat also fails when a
+search takes longer than --redos-threshold; one that timing does not
+confirm is reported as a warning.
 """
 
+import argparse
+import contextlib
+import functools
+import io
 import json
+import multiprocessing
 import os
 import re
+import subprocess
 import sys
+import time
+from collections import namedtuple
 from pathlib import Path
 
+from pattern_bundle import iter_product_patterns
+from pattern_matcher.defaults import DEFAULT_REDOS_LENGTH, DEFAULT_REDOS_THRESHOLD
+from pattern_matcher.redos import check_redos
+from validation_index import changed_files, cross_file_errors, update_index
+
+# Outcome of validating one file; pattern_timings holds (position, name, test cases, failed, seconds)
+ValidationResult = namedtuple('ValidationResult', 'file_path valid errors seconds pattern_timings')
+
+# expected_version of test cases whose pattern captures no version
+UNKNOWN_VERSION = 'unknown'
+
+# Times each test search is repeated, keeping the fastest, to even out timer noise
+SEARCH_REPEATS = 3
+
 
 def find_pattern_files(root_dir):
     """Find all pattern files in the repository."""
@@ -20,7 +69,18 @@ def find_pattern_files(root_dir):
             if file.endswith('.json'):
                 pattern_files.append(os.path.join(root, file))
     
-    return pattern_files
+    return sorted(pattern_files)
+
+
+def select_pattern_files(paths, patterns_dir):
+    """Return the existing product files among paths, as sorted absolute paths"""
+    by_vendor_dir = os.path.join(os.path.abspath(patterns_dir), 'by-vendor') + os.sep
+    selected = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        if path.startswith(by_vendor_dir) and path.endswith('.json') and os.path.isfile(path):
+            selected.add(path)
+    return sorted(selected)
 
 
 def validate_pattern_file(file_path):
@@ -71,6 +131,192 @@ def validate_pattern_file(file_path):
         return False
 
 
+def run_test_cases(file_path):
+    """Run the test cases of every pattern in a file and return (passed, pattern timings)
+    
+    Each pattern is compiled once and searched in the input of each of its
+    test cases. The captured version_group must equal expected_version, or
+    expected_version must be "unknown" if nothing is captured. Patterns that
+    cannot be run, such as invalid regexes, are left to the structure checks.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return True, []
+    if not isinstance(data, dict):
+        return True, []
+    
+    passed = True
+    pattern_timings = []
+    for position, pattern in enumerate(iter_product_patterns(data)):
+        if not isinstance(pattern, dict):
+            continue
+        metadata = pattern.get('metadata')
+        test_cases = metadata.get('test_cases') if isinstance(metadata, dict) else None
+        if not isinstance(test_cases, list) or not test_cases:
+            continue
+        try:
+            regex = re.compile(pattern['pattern'])
+        except (KeyError, TypeError, re.error):
+            continue
+        
+        name = pattern.get('name', pattern['pattern'])
+        version_group = pattern.get('version_group')
+        elapsed = 0.0
+        failed = 0
+        for number, test_case in enumerate(test_cases, 1):
+            if not isinstance(test_case, dict) or not isinstance(test_case.get('input'), str):
+                continue
+            fastest = None
+            for repeat in range(SEARCH_REPEATS):
+                start = time.perf_counter()
+                match = regex.search(test_case['input'])
+                seconds = time.perf_counter() - start
+                fastest = seconds if fastest is None else min(fastest, seconds)
+            elapsed += fastest
+            
+            if match is None:
+                print(f"Error: Test case {number} of pattern '{name}' does not match its input in {file_path}")
+                passed = False
+                failed += 1
+                continue
+            version = None
+            if isinstance(version_group, int) and 0 < version_group <= len(match.groups()):
+                version = match.group(version_group)
+            expected = test_case.get('expected_version')
+            if version != expected and not (version is None and expected == UNKNOWN_VERSION):
+                print(f"Error: Test case {number} of pattern '{name}' captured version {version!r}, "
+                      f"expected {expected!r} in {file_path}")
+                passed = False
+                failed += 1
+        pattern_timings.append((position, name, len(test_cases), failed, elapsed))
+    
+    return passed, pattern_timings
+
+
+def check_backtracking(file_path, threshold, max_length):
+    """Check every pattern in a file for catastrophic backtracking and return True if none is found
+    
+    threshold is in seconds, see check_redos(). Patterns that cannot be checked, such as
+    invalid regexes, are left to the structure checks.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return True
+    if not isinstance(data, dict):
+        return True
+    
+    safe = True
+    for pattern in iter_product_patterns(data):
+        if not isinstance(pattern, dict) or not isinstance(pattern.get('pattern'), str):
+            continue
+        for finding in check_redos(pattern['pattern'], threshold, max_length):
+            name = pattern.get('name', pattern['pattern'])
+            timing = (f"a search of {finding.length} characters took {finding.seconds * 1000:.0f} ms, "
+                      f"{finding.growth:.1f} times as long as one of half the length")
+            if not finding.confirmed:
+                print(f"Warning: Pattern '{name}' may backtrack ({finding.kind}: {finding.description}), "
+                      f"but timing does not confirm it; {timing}, in {file_path}")
+                continue
+            print(f"Error: Pattern '{name}' is prone to catastrophic backtracking "
+                  f"({finding.kind}: {finding.description}); {timing}, in {file_path}")
+            safe = False
+    return safe
+
+
+def validate_file_captured(file_path, run_tests=False, redos=None):
+    """Validate a pattern file into a ValidationResult
+    
+    The test cases are run if run_tests is set, and the patterns are checked
+    for catastrophic backtracking if redos is a (threshold seconds, maximum
+    input length) pair. The errors validate_pattern_file() and the checks
+    print are captured instead, so that pool workers can hand them back to
+    be printed in path order.
+    """
+    output = io.StringIO()
+    pattern_timings = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        valid = validate_pattern_file(file_path)
+        if run_tests:
+            passed, pattern_timings = run_test_cases(file_path)
+            valid = valid and passed
+        if redos is not None:
+            valid = check_backtracking(file_path, *redos) and valid
+    seconds = time.perf_counter() - start
+    return ValidationResult(file_path, valid, output.getvalue().splitlines(), seconds, pattern_timings)
+
+
+def validate_files(pattern_files, jobs, run_tests=False, redos=None):
+    """Yield a ValidationResult for each of pattern_files, in order"""
+    validate = functools.partial(validate_file_captured, run_tests=run_tests, redos=redos)
+    if jobs <= 1:
+        yield from map(validate, pattern_files)
+        return
+    
+    # Files take under a millisecond each, so hand them out in chunks
+    chunk_size = max(1, len(pattern_files) // (jobs * 8))
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(validate, pattern_files, chunk_size)
+
+
+def slowest_patterns(results, patterns_dir, count=None):
+    """Return (pattern ID, test cases, failed, seconds) of the patterns that ran tests, slowest search first
+    
+    Patterns are ranked by their average time per test case; count limits
+    how many are returned.
+    """
+    timings = []
+    for result in results:
+        relpath = os.path.relpath(result.file_path, patterns_dir)
+        for position, name, tests, failed, seconds in result.pattern_timings:
+            timings.append((f"{relpath}#{position}", tests, failed, seconds))
+    timings.sort(key=lambda timing: timing[3] / timing[1], reverse=True)
+    return timings[:count]
+
+
+def write_summary(path, repo_root, results, cross_errors, jobs, elapsed, run_tests=False):
+    """Write a JSON summary of the failures and timings of a validation run"""
+    def relative(file_path):
+        return os.path.relpath(file_path, repo_root)
+    
+    failures = [{'file': relative(result.file_path), 'errors': result.errors}
+                for result in results if not result.valid]
+    timings = sorted(((result.seconds, relative(result.file_path)) for result in results), reverse=True)
+    summary = {
+        'files': len(results),
+        'failed': len(failures),
+        'cross_file_failed': len({file_path for file_path, message in cross_errors}),
+        'jobs': jobs,
+        'elapsed_ms': round(elapsed * 1000, 3),
+        'validation_ms': round(sum(seconds for seconds, file in timings) * 1000, 3),
+        'failures': failures,
+        'cross_file_errors': [{'file': relative(file_path), 'error': message}
+                              for file_path, message in cross_errors],
+        'slowest': [{'file': file, 'ms': round(seconds * 1000, 3)} for seconds, file in timings[:20]],
+        'timings_ms': {relative(result.file_path): round(result.seconds * 1000, 3) for result in results},
+    }
+    if run_tests:
+        patterns_dir = os.path.join(repo_root, 'patterns')
+        pattern_timings = slowest_patterns(results, patterns_dir)
+        summary['tests'] = {
+            'patterns': len(pattern_timings),
+            'test_cases': sum(tests for pattern_id, tests, failed, seconds in pattern_timings),
+            'failed': sum(failed for pattern_id, tests, failed, seconds in pattern_timings),
+        }
+        summary['slowest_patterns'] = [
+            {'pattern_id': pattern_id, 'test_cases': tests, 'failed': failed,
+             'us_per_search': round(seconds / tests * 1e6, 3)}
+            for pattern_id, tests, failed, seconds in pattern_timings[:20]
+        ]
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+        f.write('\n')
+
+
 def validate_pattern_structure(pattern, file_path):
     """Validate the structure of a single pattern."""
     # Check required fields
@@ -97,6 +343,22 @@ def validate_pattern_structure(pattern, file_path):
         print(f"Error: confidence must be a number between 0.0 and 1.0 in {file_path}")
         return False
     
+    # Validate scope if present
+    if 'scope' in pattern:
+        if not isinstance(pattern['scope'], dict):
+            print(f"Error: scope must be an object in {file_path}")
+            return False
+        
+        search = pattern['scope'].get('search', 'all')
+        if not isinstance(search, str) or not re.fullmatch(r'all|body|headers|headers\[[^\]]+\]', search):
+            print(f"Error: scope.search must be 'all', 'body', 'headers' or 'headers[<name>]' in {file_path}")
+            return False
+        
+        status = pattern['scope'].get('status')
+        if status is not None and (not isinstance(status, int) or status < 100 or status > 599):
+            print(f"Error: scope.status must be an HTTP status code in {file_path}")
+            return False
+    
     # Validate metadata if present
     if 'metadata' in pattern:
         if not isinstance(pattern['metadata'], dict):
@@ -138,25 +400,97 @@ def main():
     # Get the repository root directory
     script_dir = os.path.dirname(os.path.abspath(__file__))
     repo_root = os.path.dirname(script_dir)
+    patterns_dir = os.path.join(repo_root, 'patterns')
     
-    print("Validating all pattern files...")
-    
-    # Find all pattern files
-    pattern_files = find_pattern_files(repo_root)
+    parser = argparse.ArgumentParser(description="Validate all pattern files in the repository")
+    parser.add_argument('files', nargs='*',
+                        help="validate only these pattern files (default: all of them)")
+    parser.add_argument('--changed', metavar='REVISIONS',
+                        help="validate only the pattern files git diff reports as changed in REVISIONS, "
+                             "e.g. origin/master...HEAD")
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help="validate on N worker processes, 0 for one per CPU (default: 1)")
+    parser.add_argument('--json', metavar='FILE',
+                        help="write a JSON summary of the failures and timings to FILE")
+    parser.add_argument('--run-tests', action='store_true',
+                        help="also run the test_cases of every pattern against the pattern")
+    parser.add_argument('--slowest', type=int, default=10, metavar='N',
+                        help="with --run-tests, list the N patterns with the slowest searches (default: 10)")
+    parser.add_argument('--redos', action='store_true',
+                        help="also check every pattern for catastrophic backtracking")
+    parser.add_argument('--redos-threshold', type=float, default=DEFAULT_REDOS_THRESHOLD * 1000, metavar='MS',
+                        help="stop growing an adversarial input once a search takes longer than this "
+                             f"(default: {DEFAULT_REDOS_THRESHOLD * 1000:g})")
+    parser.add_argument('--redos-length', type=int, default=DEFAULT_REDOS_LENGTH, metavar='CHARS',
+                        help=f"longest adversarial input to time (default: {DEFAULT_REDOS_LENGTH})")
+    args = parser.parse_args()
+    jobs = args.jobs or os.cpu_count() or 1
+    redos = (args.redos_threshold / 1000, args.redos_length) if args.redos else None
     
-    if not pattern_files:
-        print("No pattern files found!")
-        return 1
+    incremental = bool(args.files or args.changed)
+    if incremental:
+        paths = list(args.files)
+        if args.changed:
+            try:
+                paths.extend(changed_files(repo_root, args.changed))
+            except (OSError, subprocess.CalledProcessError) as e:
+                reason = (getattr(e, 'stderr', '') or str(e)).strip()
+                print(f"Error: Could not list the files changed in {args.changed}: {reason}")
+                return 1
+        
+        print("Validating changed pattern files...")
+        pattern_files = select_pattern_files(paths, patterns_dir)
+        if not pattern_files:
+            print("No changed pattern files to validate")
+            return 0
+    else:
+        print("Validating all pattern files...")
+        
+        # Find all pattern files
+        pattern_files = find_pattern_files(repo_root)
+        
+        if not pattern_files:
+            print("No pattern files found!")
+            return 1
     
     print(f"Found {len(pattern_files)} pattern files to validate")
     
-    # Validate each pattern file
-    validation_failed = False
-    for pattern_file in pattern_files:
-        if not validate_pattern_file(pattern_file):
-            validation_failed = True
+    # Validate each pattern file, printing errors in path order
+    start = time.perf_counter()
+    results = []
+    for result in validate_files(pattern_files, jobs, args.run_tests, redos):
+        results.append(result)
+        for line in result.errors:
+            print(line)
+    
+    # Check for collisions with the other product files through the index
+    products, reread = update_index(patterns_dir)
+    selected = {os.path.relpath(file_path, patterns_dir) for file_path in pattern_files} if incremental else None
+    cross_errors = [(os.path.join(patterns_dir, relpath), message)
+                    for relpath, message in cross_file_errors(products, selected)]
+    for file_path, message in cross_errors:
+        print(f"Error: {message} in {file_path}")
+    elapsed = time.perf_counter() - start
+    
+    failed = sum(1 for result in results if not result.valid)
+    print(f"\nValidated {len(results)} files in {elapsed:.2f}s with {jobs} job(s), {failed} failed")
+    if args.run_tests:
+        pattern_timings = slowest_patterns(results, patterns_dir)
+        test_cases = sum(tests for pattern_id, tests, failed, seconds in pattern_timings)
+        failed_tests = sum(failed for pattern_id, tests, failed, seconds in pattern_timings)
+        print(f"Ran {test_cases} test cases of {len(pattern_timings)} patterns, {failed_tests} failed")
+        if args.slowest > 0 and pattern_timings:
+            print("Slowest patterns per search:")
+            for pattern_id, tests, failures, seconds in pattern_timings[:args.slowest]:
+                print(f"  {seconds / tests * 1e6:10.1f} us  {pattern_id} ({tests} test cases)")
+    print(f"Checked {len(products)} indexed product files for collisions ({len(reread)} reread), "
+          f"{len(cross_errors)} found")
+    
+    if args.json:
+        write_summary(args.json, repo_root, results, cross_errors, jobs, elapsed, args.run_tests)
+        print(f"Summary written to {args.json}")
     
-    if validation_failed:
+    if failed or cross_errors:
         print("\nValidation failed!")
         return 1
     else:
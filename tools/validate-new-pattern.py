@@ -8,6 +8,8 @@ import sys
 import os
 import re
 
+from pattern_matcher.redos import check_redos
+
 
 def validate_new_pattern(file_path):
     """Validate a pattern file in the new format"""
@@ -74,6 +76,18 @@ def validate_pattern_structure(pattern):
         print(f"Error: Invalid regex pattern '{pattern['pattern']}': {e}")
         return False
     
+    # Validate pattern does not backtrack catastrophically on adversarial input
+    for finding in check_redos(pattern['pattern']):
+        timing = (f"a search of {finding.length} characters took {finding.seconds * 1000:.0f} ms, "
+                  f"{finding.growth:.1f} times as long as one of half the length")
+        if not finding.confirmed:
+            print(f"Warning: Regex pattern '{pattern['pattern']}' may backtrack "
+                  f"({finding.kind}: {finding.description}), but timing does not confirm it; {timing}")
+            continue
+        print(f"Error: Regex pattern '{pattern['pattern']}' is prone to catastrophic backtracking "
+              f"({finding.kind}: {finding.description}); {timing}")
+        return False
+    
     # Validate version_group is an integer
     if not isinstance(pattern['version_group'], int):
         print(f"Error: version_group must be an integer")
@@ -89,6 +103,22 @@ def validate_pattern_structure(pattern):
         print(f"Error: confidence must be a number between 0.0 and 1.0")
         return False
     
+    # Validate scope if present
+    if 'scope' in pattern:
+        if not isinstance(pattern['scope'], dict):
+            print(f"Error: scope must be an object")
+            return False
+        
+        search = pattern['scope'].get('search', 'all')
+        if not isinstance(search, str) or not re.fullmatch(r'all|body|headers|headers\[[^\]]+\]', search):
+            print(f"Error: scope.search must be 'all', 'body', 'headers' or 'headers[<name>]'")
+            return False
+        
+        status = pattern['scope'].get('status')
+        if status is not None and (not isinstance(status, int) or status < 100 or status > 599):
+            print(f"Error: scope.status must be an HTTP status code")
+            return False
+    
     # Validate metadata if present
     if 'metadata' in pattern:
         if not isinstance(pattern['metadata'], dict):
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Index of product identities for cross-file validation checks
+
+Checks such as "no two product files declare the same vendor_id and
+product_id" need the IDs of every product file, but a pattern change
+touches one or two files. The index, build/validation-index.json by default,
+keeps the vendor, vendor_id, product and product_id of each product file:
+
+    {"content_hash": "...",
+     "products": {"by-vendor/apache/httpd.json": {"vendor": "Apache", "vendor_id": "apache", ...}}}
+
+It is refreshed like the bundle and the catalog: the build state records the
+size, mtime and SHA-256 of every file it was built from, and only files
+whose content changed are read again. Refreshing it costs one stat per file
+plus work proportional to the change.
+"""
+
+import json
+import os
+import subprocess
+from collections import defaultdict
+
+from build_state import (default_state_path, diff_sources, load_state, previous_build, record_build,
+                         save_state, scan_sources, sources_digest)
+from pattern_bundle import find_product_files
+
+IDENTITY_FIELDS = ('vendor', 'vendor_id', 'product', 'product_id')
+
+
+def default_index_path(patterns_dir):
+    """Return where the validation index for a patterns directory is kept by default"""
+    return os.path.join(os.path.dirname(os.path.abspath(patterns_dir)), 'build', 'validation-index.json')
+
+
+def product_identity(product_path):
+    """Return the identity fields of a product file, or None if it is not a readable JSON object"""
+    try:
+        with open(product_path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    return {field: data.get(field) for field in IDENTITY_FIELDS}
+
+
+def load_index(index_path, previous):
+    """Return the products of the index a build state record describes, or None if it is unusable"""
+    if previous is None:
+        return None
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(index, dict) or index.get('content_hash') != previous.get('content_hash'):
+        return None
+    return index.get('products')
+
+
+def update_index(patterns_dir, index_path=None, state_path=None):
+    """Bring the validation index up to date and return (products, reread paths)
+    
+    products maps the relative path of every product file to its identity
+    fields, or to None for files that are not readable JSON objects.
+    """
+    index_path = index_path or default_index_path(patterns_dir)
+    state_path = state_path or default_state_path(patterns_dir)
+    state = load_state(state_path)
+    previous = previous_build(state, 'validation-index', index_path)
+    products = load_index(index_path, previous)
+    if products is None:
+        previous, products = None, {}
+    
+    sources = scan_sources(patterns_dir, find_product_files(patterns_dir),
+                           previous['files'] if previous else None)
+    changed, removed = diff_sources(previous['files'] if previous else {}, sources)
+    
+    for relpath in removed:
+        products.pop(relpath, None)
+    for relpath in changed:
+        products[relpath] = product_identity(os.path.join(patterns_dir, relpath))
+    
+    if previous is None or changed or removed or previous['files'] != sources:
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        temp_path = index_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'content_hash': sources_digest(sources), 'products': products}, f, sort_keys=True)
+        os.replace(temp_path, index_path)
+        record_build(state, 'validation-index', index_path, sources)
+        save_state(state_path, state)
+    
+    return products, changed
+
+
+def cross_file_errors(products, selected=None):
+    """Return sorted (relative path, message) errors of the checks that span product files
+    
+    Two product files must not share a vendor_id and product_id, and one
+    vendor_id must not be used with different vendor names. With selected,
+    a set of relative paths, only collisions involving one of them are
+    reported.
+    """
+    by_product = defaultdict(list)
+    by_vendor_id = defaultdict(lambda: defaultdict(list))
+    for relpath, identity in products.items():
+        if identity is None or identity['vendor_id'] is None:
+            continue
+        if identity['product_id'] is not None:
+            by_product[(identity['vendor_id'], identity['product_id'])].append(relpath)
+        by_vendor_id[identity['vendor_id']][identity['vendor']].append(relpath)
+    
+    errors = []
+    for (vendor_id, product_id), relpaths in by_product.items():
+        if len(relpaths) > 1:
+            for relpath in relpaths:
+                others = ', '.join(sorted(set(relpaths) - {relpath}))
+                errors.append((relpath, f"Duplicate vendor_id '{vendor_id}' and product_id '{product_id}', "
+                                        f"also declared in {others}"))
+    
+    for vendor_id, vendors in by_vendor_id.items():
+        if len(vendors) > 1:
+            names = ', '.join(sorted(repr(vendor) for vendor in vendors))
+            for relpaths in vendors.values():
+                for relpath in relpaths:
+                    errors.append((relpath, f"vendor_id '{vendor_id}' is used with different vendor names: {names}"))
+    
+    if selected is not None:
+        errors = [(relpath, message) for relpath, message in errors if relpath in selected]
+    return sorted(errors)
+
+
+def changed_files(repo_root, revisions):
+    """Return the absolute paths of the pattern files git reports as changed in revisions
+    
+    revisions is anything git diff accepts, such as "origin/master...HEAD"
+    for the changes of a branch, or "HEAD" for uncommitted changes. Deleted
+    files are left out. Raises subprocess.CalledProcessError if git fails.
+    """
+    output = subprocess.run(['git', 'diff', '--name-only', '--diff-filter=d', revisions, '--', 'patterns'],
+                            cwd=repo_root, capture_output=True, text=True, check=True).stdout
+    return sorted(os.path.join(repo_root, path) for path in output.splitlines() if path.endswith('.json'))